@@ -5,4 +5,6 @@ sys.path.insert(0, os.path.dirname(__file__))
 import _abstract as _abstract
 
 import classifier as classifier
-import regressor as regressor
\ No newline at end of file
+import regressor as regressor
+import sweep as sweep
+import instrumentation as instrumentation
\ No newline at end of file
@@ -1,119 +1,1069 @@
-from pandas import DataFrame
-from numpy import unique
-from IPython.display import display
-from IPython import get_ipython
-from graphviz import Digraph
+import os, json
+from os import cpu_count
+from heapq import heappush, heappop
+from math import ceil, log2
+from multiprocessing import get_context, get_all_start_methods
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from pandas import DataFrame, Series, factorize
+from numpy import unique, arange, count_nonzero, asarray, empty, zeros, \
+    array_equal, union1d, flatnonzero, floating, float64, intp, save, load
 
 from ScratchML._model_types import PredictionModel
+from ScratchML.DecisionTrees._histogram import FeatureBins
+from ScratchML.DecisionTrees._flat import FlatTree, typed
+from ScratchML.DecisionTrees.instrumentation import TreeEvents
+
+# below this many samples, scoring the features on the pool costs more than it saves
+PARALLEL_MIN_SAMPLES = 2048
+
+# the tree and its frontier nodes, inherited by the forked subtree workers (see DecisionTree._fitForked)
+_forked = None
+
+
+def _fit_forked(k: int):
+    """
+    Fit a single frontier subtree in a forked worker
+
+    Args:
+        k (int): the index of the subtree root in the frontier
+
+    Returns:
+        tuple: the fitted subtree, detached from the training data, and the worker events
+    """
+    
+    tree, frontier = _forked
+    
+    # the worker events start empty, they are merged back into the events of the fit
+    events = frontier[k].train.events
+    if events is not None:
+        frontier[k].train.events = events = events.spawn()
+    
+    return tree._fitSubtree(frontier[k]), events
+
+
+def _partition_rows(rows, goes_left):
+    """
+    Partition row indices in place, left rows first (not stably).
+        Only the misplaced rows move: the right rows before the split point
+        are swapped with the left rows after it, as a two-pointer partition does.
+
+    Args:
+        rows (np.ndarray): the row indices, a view into the shared rows
+        goes_left (np.ndarray): whether every row goes to the left
+
+    Returns:
+        tuple: the number of left rows and the number of swapped pairs
+    """
+    
+    middle = count_nonzero(goes_left)
+    
+    # as many right rows stand before the split point as left rows after it
+    right = flatnonzero(~goes_left[:middle])
+    left = middle + flatnonzero(goes_left[middle:])
+    rows[right], rows[left] = rows[left], rows[right]
+    
+    return middle, len(right)
+
+class TrainingData:
+    """
+    Shared Training Data Definition.
+        The nodes of a tree being fitted don't copy the data, each node holds
+        a range of the row indices, which are partitioned in place on every split.
+        The columns are encoded once into a single float matrix: numeric columns as is,
+        the other columns as the codes of their sorted categories.
+        The same training data may be fitted by many trees in turn (see ScratchML.Ensembles),
+        between the fits the rows may be subsampled, the samples reweighted or the label replaced.
+    """
+    def __init__(self, data: DataFrame, label: str, weights=None):
+        """
+        Training Data Constructor
+
+        Args:
+            data (DataFrame): the training data
+            label (str): the name of the label column
+            weights (np.ndarray, optional): the weight of every sample in the impurity,
+                None to count every sample once. Defaults to None.
+        """
+        
+        self.labels = data.columns.values
+        self.label = data.columns.get_loc(label)
+        self.rows = arange(len(data))
+        
+        # feature-major, so a node gathers contiguous rows of a column
+        self.X = empty((len(self.labels), len(data)), dtype=float64)
+        # the categories of every encoded column, None for a numeric column
+        self.categories = []
+        
+        for i, name in enumerate(self.labels):
+            column = data[name].values
+            try:
+                self.X[i] = column.astype(float64)
+                self.categories.append(None)
+            except (ValueError, TypeError):
+                codes, categories = factorize(column, sort=True)
+                self.X[i] = codes
+                self.categories.append(asarray(categories))
+        
+        # the label, as class codes or as numeric values
+        self.y = self.X[self.label].astype(intp) if self.categories[self.label] is not None else self.X[self.label]
+        
+        self.weights = None if weights is None else asarray(weights, dtype=float64)
+        if self.weights is not None and self.weights.shape != (len(data),):
+            raise ValueError(f"expected {len(data)} sample weights, got {self.weights.shape}")
+        
+        # whether every column is categorical (see DecisionTree.schema), and the categorical
+        # features it was inferred for, shared by the trees fitted in turn (see DecisionTree._shared_schema)
+        self.schema = None
+        self.declared = None
+        
+        # for histogram-binned training (see DecisionTree.maxBins)
+        self.bins = None
+        
+        # for parallel split search (see DecisionTree.n_jobs)
+        self.pool = None
+        
+        # for random forests, the number of features scored by every node and their random source
+        # (see DecisionNode._candidates)
+        self.maxFeatures = None
+        self.random = None
+        
+        # for fit instrumentation (see DecisionTree.fit)
+        self.events = None
+    
+    
+    def decoded(self):
+        """
+        The training samples, one array per column, as the compiled trees compare them
+            (see FlatTree.predict): numeric columns as floats, the other columns as their categories
+
+        Returns:
+            list: the column arrays
+        """
+        
+        return typed([column if categories is None else categories[column.astype(intp)]
+                      for column, categories in zip(self.X, self.categories)])
+    
+    
+    def encode(self, index: int, value):
+        """
+        The code of a value of a column
+
+        Args:
+            index (int): the column index
+            value (any): the value
+
+        Returns:
+            any: the code of an encoded column, NaN (matching no code) for a value missing
+                from its categories, the value itself for a numeric one
+        """
+        
+        if self.categories[index] is None:
+            return value
+        
+        code = flatnonzero(self.categories[index] == value)
+        
+        return float(code[0]) if len(code) else float("nan")
+    
+    
+    def decode(self, index: int, code):
+        """
+        The value of a code of a column
+
+        Args:
+            index (int): the column index
+            code (any): the code
+
+        Returns:
+            any: the category of an encoded column, the code itself for a numeric one
+        """
+        
+        if self.categories[index] is None:
+            return code
+        
+        return self.categories[index][int(code)]
+
 
 class DecisionNode:
     """
     Abstract Decision Node Definition
     """
     cnt = 0
-    def __init__(self, data: DataFrame, left=None, right=None, depth:int=0):
+    def __init__(self, data: TrainingData, start:int=0, end:int=None, left=None, right=None, depth:int=0):
+        """
+        Abstract Decision Node Constructor
+        Args:
+            data (TrainingData): the shared training data.
+            start (int, optional): the first position of the node rows in data.rows. Defaults to 0.
+            end (int, optional): the position after the last node row in data.rows. Defaults to all the rows.
+            left (DecisionNode, optional): the left child node. Defaults to None.
+            right (DecisionNode, optional): the right child node. Defaults to None.
+            depth (int, optional): The depth of the node. Defaults to 0.
+        """
+        
+        self.left = left
+        self.right = right
+        self.train = data
+        self.start = start
+        self.end = len(data.rows) if end is None else end
+        self.data_labels = data.labels
+        self.depth = depth
+        self.featureName = ""
+        self.featureIndex = 0
+        self.featureVal = 0
+        self.categorical = False
+        self.samples = self.end - self.start
+        
+        # for histogram-binned training (see DecisionTree.maxBins)
+        self.hist = None
+        self.featureBin = 0
+        
+        # the time of the split search, None until the node is searched (see DecisionTree._search)
+        self.searched = None
+        
+        # the sufficient statistics of the node samples, kept once the tree is fitted
+        # (see DecisionTree.partial_fit)
+        self.stats = None
+        
+        # for visualization purposes
+        self.id = str(DecisionNode.cnt)
+        DecisionNode.cnt += 1
+        
+        if data.events is not None:
+            data.events.node_created(self)
+    
+    @property
+    def rows(self):
+        """
+        The row indices of the node samples (a view, not a copy)
+
+        Returns:
+            np.ndarray: the row indices
+        """
+        
+        return self.train.rows[self.start:self.end]
+    
+    def column(self, index: int):
+        """
+        Gather a single column of the node samples
+
+        Args:
+            index (int): the column index
+
+        Returns:
+            np.ndarray: the column values of the node samples
+        """
+        
+        return self.train.X[index, self.rows]
+    
+    def target(self):
+        """
+        Gather the label of the node samples
+
+        Returns:
+            np.ndarray: the class codes or the numeric values of the node samples
+        """
+        
+        return self.train.y[self.rows]
+    
+    def weight(self):
+        """
+        Gather the weight of the node samples
+
+        Returns:
+            np.ndarray: the sample weights, None if every sample counts once
+        """
+        
+        if self.train.weights is None:
+            return None
+        
+        return self.train.weights[self.rows]
+        
+    def _bestSplit(self):
+        """
+        Get the best split of the decision node.
+            This method is expanded later in the child classes
+        """
+        pass
+    
+    def _scoreFeature(self, i: int):
+        """
+        Find the best split of a single feature.
+            This method is expanded later in the child classes
+
+        Args:
+            i (int): the feature index
+        """
+        pass
+    
+    def _candidates(self, features: list):
+        """
+        The features the node scores: all of them, or a random subset of
+            TrainingData.maxFeatures features when growing a random forest
+
+        Args:
+            features (list): the feature indices
+
+        Returns:
+            list: the feature indices to score, in the given order
+        """
+        
+        if self.train.maxFeatures is None or self.train.maxFeatures >= len(features):
+            return features
+        
+        chosen = self.train.random.choice(len(features), self.train.maxFeatures, replace=False)
+        
+        return [features[k] for k in sorted(chosen)]
+    
+    def _scoreFeatures(self, features: list):
+        """
+        Find the best split of every given feature.
+            Large nodes score their features concurrently on the training data pool.
+
+        Args:
+            features (list): the feature indices
+
+        Returns:
+            list: the _scoreFeature result of every feature, in the given order
+        """
+        
+        score = self._scoreFeature if self.train.events is None else self._scoreFeatureTraced
+        
+        if self.train.pool is None or self.samples < PARALLEL_MIN_SAMPLES:
+            return [score(i) for i in features]
+        
+        return list(self.train.pool.map(score, features))
+    
+    def _scoreFeatureTraced(self, i: int):
+        """
+        Find the best split of a single feature, timed and reported to the fit events
+
+        Args:
+            i (int): the feature index
+
+        Returns:
+            tuple: the _scoreFeature result
+        """
+        
+        start = perf_counter()
+        result = self._scoreFeature(i)
+        self.train.events.split_evaluated(self, i, result[0], result[3], perf_counter() - start)
+        
+        return result
+    
+    def _categoryCount(self, index: int):
+        """
+        The number of categories of an encoded column, whose values are the category codes
+
+        Args:
+            index (int): the feature index
+
+        Returns:
+            int: the number of categories, None for a numeric column declared categorical
+        """
+        
+        categories = self.train.categories[index]
+        
+        return None if categories is None else len(categories)
+    
+    def _binCount(self, index: int):
+        """
+        The number of split candidates of a feature in the histogram-binned split search:
+            its category bins if it is categorical, the thresholds between its bins if not
+
+        Args:
+            index (int): the feature index
+
+        Returns:
+            int: the number of split candidates
+        """
+        
+        bins = self.train.bins
+        
+        return len(bins.categories[index]) if self.train.schema[index] else len(bins.thresholds[index])
+    
+    def _binValue(self, index: int, featureBin: int):
+        """
+        The split value of a bin found by the histogram-binned split search
+
+        Args:
+            index (int): the feature index
+            featureBin (int): the category bin, or the first bin of the right side
+
+        Returns:
+            any: the category of a categorical feature, the threshold of a numeric one
+        """
+        
+        if self.train.schema[index]:
+            return self.train.decode(index, self.train.bins.categories[index][featureBin])
+        
+        return self.train.bins.thresholds[index][featureBin-1]
+    
+    def _histogram(self, rows):
+        """
+        Build the per-bin statistics of the given rows, for every feature.
+            This method is expanded later in the child classes
+
+        Args:
+            rows (np.ndarray): the row indices into the binned training data
+        """
+        pass
+    
+    def _statistics(self):
+        """
+        The sufficient statistics of the node samples, which add up over disjoint samples.
+            This method is expanded later in the child classes
+        """
+        pass
+    
+    def _impurity(self, stats):
+        """
+        The total impurity of samples of the given sufficient statistics.
+            This method is expanded later in the child classes
+
+        Args:
+            stats (np.ndarray): the sufficient statistics (see _statistics)
+        """
+        pass
+    
+    def _updateValue(self):
+        """
+        Set the prediction of the node from its sufficient statistics.
+            This method is expanded later in the child classes
+        """
+        pass
+    
+    def _splitGain(self):
+        """
+        The impurity reduction of the best split found by _bestSplit.
+            This method is expanded later in the child classes
+        """
+        pass
+
+class DecisionTree(PredictionModel):
+    """
+    Decision tree abstract definition
+    """
+    def __init__(self, maxDepth: int, minSample: int, maxBins: int=None, categorical: list=None,
+                 n_jobs: int=None, maxLeafNodes: int=None, minGain: float=0.0):
+        """
+        Decision Tree constructor
+
+        Args:
+            maxDepth (int): the max depth of the decision tree
+            minSample (int): the least samples in a node allowed to be split
+            maxBins (int, optional): train on features quantized into at most maxBins
+                bins (up to 255) instead of the exact values. Defaults to None.
+            categorical (list, optional): the names of the categorical features,
+                None to infer them from the training data. Defaults to None.
+            n_jobs (int, optional): the number of threads scoring the features of a node
+                concurrently, -1 for one per core. Defaults to None (serial).
+            maxLeafNodes (int, optional): grow the tree best-first, splitting the leaf of
+                the largest impurity reduction first, up to maxLeafNodes leaves. Defaults to None.
+            minGain (float, optional): grow the tree best-first, splitting only the leaves whose
+                impurity reduction per training sample (an mse for a regressor, a gini for a classifier)
+                is above minGain. Defaults to 0.0.
+        """
+        
+        if maxBins is not None and not 2 <= maxBins <= 255:
+            raise ValueError(f"maxBins must be between 2 and 255, got {maxBins}")
+        if n_jobs is not None and not (n_jobs == -1 or n_jobs >= 1):
+            raise ValueError(f"n_jobs must be -1 or a positive number, got {n_jobs}")
+        if maxLeafNodes is not None and maxLeafNodes < 2:
+            raise ValueError(f"maxLeafNodes must be at least 2, got {maxLeafNodes}")
+        if minGain < 0:
+            raise ValueError(f"minGain can't be negative, got {minGain}")
+        
+        self.root : DecisionNode = None
+        self.maxDepth = maxDepth
+        self.minSample = minSample
+        self.maxBins = maxBins
+        self.categorical = categorical
+        self.n_jobs = n_jobs
+        self.maxLeafNodes = maxLeafNodes
+        self.minGain = minGain
+        
+        # whether every column is categorical, fixed at fit time (see _infer_schema)
+        self.schema = None
+        
+        # the training column names, the label name, and the categories of every encoded column
+        # (see TrainingData)
+        self.columns = None
+        self.label = None
+        self.categories = None
+        
+        # the nodes left to the subtree workers, while the top of the tree is grown (see _fitForked)
+        self._frontier = None
+        self._frontierDepth = None
+        
+        # the leaves left to split while the tree is grown best-first, by the gain of their split,
+        # and the least gain of a split (see _fitBestFirst)
+        self._queue = None
+        self._minGain = None
+        
+        # the compiled tree, for batch prediction (see predict_batch)
+        self.flat : FlatTree = None
+        
+        # for visualization purposes, built on first use (see graph)
+        self._graph = None
+        
+        # the generated single-sample predictor, built on first use (see compile_to_python)
+        self._compiled = None
+
+   
+    def _can_split(self, node: DecisionNode):
+        """
+        Determine if the given node can be split
+
+        Args:
+            node (DecisionNode): the node to split
+
+        Returns:
+            bool: can we split the node?
+        """
+        
+        if node is None:
+            return False
+        if (self.maxDepth > node.depth) and (self.minSample <= node.samples):
+            return True
+        return False
+             
+    
+    def _split(self, node: DecisionNode):
+        """
+        Split the node on the most fitting axis.
+            The node rows are partitioned in place, left rows first.
+        
+        Args:
+            node (DecisionNode): the node to split
+            
+        Returns:
+            tuple: the (start, end) ranges of the right and the left child rows
+        """
+
+        events = node.train.events
+        
+        # the split of a node grown best-first is searched when it is queued
+        if node.searched is None:
+            self._search(node)
+        
+        if events is not None:
+            start = perf_counter()
+        
+        # If the split was found on the histogram bins
+        if node.train.bins is not None:
+            codes = node.train.bins.codes[node.featureIndex, node.rows]
+            goes_left = codes == node.featureBin if node.categorical else codes < node.featureBin
+        
+        # If the feature is categorial
+        elif node.categorical:
+            goes_left = node.column(node.featureIndex) == node.train.encode(node.featureIndex, node.featureVal)
+        
+        # Else, if the feature to split of this node is numeric
+        else:
+            goes_left = node.column(node.featureIndex) < node.featureVal
+        
+        rows = node.rows
+        middle, swapped = _partition_rows(rows, goes_left)
+        middle += node.start
+        
+        # the misplaced rows are swapped: the mask, two index arrays and two gathers are allocated
+        if events is not None:
+            events.split_made(node, node.searched, perf_counter() - start, 2*swapped,
+                              goes_left.nbytes + 4*swapped*rows.itemsize)
+        
+        return (middle, node.end), (node.start, middle)
+    
+    
+    def _search(self, node: DecisionNode):
+        """
+        Find the best split of a node, and time the search
+        
+        Args:
+            node (DecisionNode): the node to search
+        """
+        
+        start = perf_counter()
+        
+        # perform node calibration
+        node._bestSplit()
+        node.categorical = node.train.schema[node.featureIndex]
+        
+        node.searched = perf_counter() - start
+    
+    
+    def _share_bins(self, node: DecisionNode):
+        """
+        Hand the histograms down to the children of a split node.
+            Only the smaller child builds its histogram from its rows,
+            the sibling histogram is the parent histogram minus the smaller one.
+        
+        Args:
+            node (DecisionNode): the split node
+        """
+        
+        if node.left is not None and node.right is not None:
+            small, large = sorted((node.left, node.right), key=lambda child: child.samples)
+            small.hist = small._histogram(small.rows)
+            large.hist = node.hist - small.hist
+        
+        node.hist = None
+    
+    
+    def fit(self, n_jobs: int=None, parallelDepth: int=None, events: TreeEvents=None):
+        """
+        Fit the model to make a Decision Maker.
+            The training data is released once the tree is grown,
+            and the tree is compiled into flat arrays for batch prediction.
+            With n_jobs, a single thread pool scores the node features for the whole fit,
+            the threads share the training data in place.
+            A tree of a maxLeafNodes or minGain budget is grown best-first, on a single process.
+        
+        Args:
+            n_jobs (int, optional): the number of worker processes growing the subtrees
+                below parallelDepth, -1 for one per core. Defaults to None (serial).
+            parallelDepth (int, optional): the depth of the subtrees handed to the workers.
+                Defaults to enough levels for two subtrees per worker.
+            events (TreeEvents, optional): notified of the nodes, the split search and the leaves
+                of the fit, e.g. a FitCollector. Defaults to None (no instrumentation).
+        """
+        
+        if self.root is None or self.root.train is None:
+            raise RuntimeError("the tree is already fitted, its training data was released")
+        if n_jobs is not None and not (n_jobs == -1 or n_jobs >= 1):
+            raise ValueError(f"n_jobs must be -1 or a positive number, got {n_jobs}")
+        
+        self.schema = self._shared_schema(self.root.train)
+        self.columns = self.root.train.labels
+        self.label = self.columns[self.root.train.label]
+        self.categories = self.root.train.categories
+        
+        if self.maxBins is not None:
+            # the bins of a previous fit on the same training data are quantized the same way
+            bins = self.root.train.bins
+            if bins is None or bins.max_bins != self.maxBins or not array_equal(bins.schema, self.schema):
+                self.root.train.bins = FeatureBins(self.root.train.X, self.maxBins,
+                                                   self.root._binned_target(), self.schema)
+            else:
+                bins.target = self.root._binned_target()
+            self.root.hist = self.root._histogram(self.root.rows)
+        
+        if self.n_jobs not in (None, 1):
+            self.root.train.pool = ThreadPoolExecutor(cpu_count() if self.n_jobs == -1 else self.n_jobs)
+        
+        self.root.train.events = events
+        if events is not None:
+            events.node_created(self.root)
+        
+        try:
+            if self.maxLeafNodes is not None or self.minGain > 0:
+                self._fitBestFirst(self.root)
+            # subtrees are grown on forked processes, which inherit the training data for free
+            elif n_jobs not in (None, 1) and "fork" in get_all_start_methods():
+                processes = cpu_count() if n_jobs == -1 else n_jobs
+                if parallelDepth is None:
+                    parallelDepth = ceil(log2(processes)) + 1
+                self._fitForked(self.root, processes, parallelDepth)
+            else:
+                self._fit(self.root)
+        finally:
+            if self.root.train.pool is not None:
+                self.root.train.pool.shutdown()
+                self.root.train.pool = None
+            self.root.train.events = None
+        
+        self.__release(self.root)
+        self.__number(self.root)
+        self.flat = FlatTree(self.root, self._leaf_value)
+        self._graph = None
+        self._compiled = None
+    
+    
+    def _fitForked(self, node: DecisionNode, processes: int, depth: int):
+        """
+        Grow the top of the tree down to the given depth, then grow every
+        subtree below it on a pool of forked processes and graft it back.
+
+        Args:
+            node (DecisionNode): the root of the decision maker
+            processes (int): the number of worker processes
+            depth (int): the depth of the subtrees handed to the workers
+        """
+        
+        global _forked
+        
+        self._frontier, self._frontierDepth = [], depth
+        try:
+            self._fit(node)
+        finally:
+            frontier, self._frontier, self._frontierDepth = self._frontier, None, None
+        
+        if not frontier:
+            return
+        
+        # the feature threads would not survive the fork, the processes take over
+        if node.train.pool is not None:
+            node.train.pool.shutdown()
+            node.train.pool = None
+        
+        # the largest subtrees are handed out first, to balance the workers
+        order = sorted(range(len(frontier)), key=lambda k: -frontier[k].samples)
+        
+        _forked = (self, frontier)
+        try:
+            with get_context("fork").Pool(min(processes, len(frontier))) as pool:
+                subtrees = pool.map(_fit_forked, order, chunksize=1)
+        finally:
+            _forked = None
+        
+        for k, (subtree, events) in zip(order, subtrees):
+            frontier[k].__dict__.update(subtree.__dict__)
+            if events is not None:
+                node.train.events.merge(events)
+    
+    
+    def _fitBestFirst(self, node: DecisionNode):
+        """
+        Grow the tree best-first: the leaves that may be split are queued by the impurity
+            reduction of their best split, and the best one is split until the tree holds
+            maxLeafNodes leaves, or no split gains more than minGain.
+            The queued leaves left once the budget is spent are made leaves.
+
+        Args:
+            node (DecisionNode): the root of the decision maker
+        """
+        
+        weight = node.weight()
+        self._minGain = self.minGain*(node.samples if weight is None else weight.sum())
+        budget = float("inf") if self.maxLeafNodes is None else self.maxLeafNodes
+        
+        self._queue, leaves = [], 1
+        try:
+            self._fit(node)
+            while self._queue and leaves < budget:
+                _, _, best = heappop(self._queue)
+                self._expand(best)
+                if best.left is not None:
+                    leaves += 1
+            
+            for _, _, leaf in self._queue:
+                self._made_leaf(leaf)
+        finally:
+            self._queue = self._minGain = None
+    
+    
+    def _enqueue(self, node: DecisionNode):
+        """
+        Search the split of a leaf grown best-first, and queue it by its impurity reduction,
+            or make it a leaf if its split doesn't gain enough
+
+        Args:
+            node (DecisionNode): the leaf
+        """
+        
+        self._search(node)
+        
+        gain = node._splitGain() if node.featureName != "" else float("-inf")
+        if gain <= self._minGain:
+            self._made_leaf(node)
+            return
+        
+        # the earlier node first among equal gains, the node ids follow the creation order
+        heappush(self._queue, (-gain, int(node.id), node))
+    
+    
+    def _fitSubtree(self, node: DecisionNode):
+        """
+        Fit a single subtree, and detach it from the training data
+
+        Args:
+            node (DecisionNode): the root of the subtree
+
+        Returns:
+            DecisionNode: the fitted subtree
+        """
+        
+        self._fit(node)
+        self.__release(node)
+        
+        return node
+    
+    
+    def partial_fit(self, data: DataFrame, tol: float=0.1):
         """
-        Abstract Decision Node Constructor
+        Refresh the fitted tree with new samples, without the samples it was fitted on.
+            The new samples are routed down the existing splits, the sufficient statistics
+            of every node they reach are updated and the node predictions refreshed.
+            A split node has drifted when its split lost its gain on the new samples (see _drifted):
+            its subtree is then regrown on the new samples reaching it, which must be at least
+            as many as the samples it was grown on. The cost grows with the new samples,
+            not with the samples the tree has seen.
+
         Args:
-            data (DataFrame): the node data.
-            left (DecisionNode, optional): the left child node. Defaults to None.
-            right (DecisionNode, optional): the right child node. Defaults to None.
-            depth (int, optional): The depth of the node. Defaults to 0.
+            data (pd.DataFrame): the new samples, holding every training column and the label
+            tol (float, optional): the share of the impurity the split of a node has to lose,
+                and another split to gain over it, on the new samples for the subtree to be regrown,
+                None to never regrow. Defaults to 0.1.
+
+        Returns:
+            int: the number of regrown subtrees
         """
         
-        self.left = left
-        self.right = right
-        self.data = data.values
-        self.data_labels = data.columns.values
-        self.depth = depth
-        self.featureName = ""
-        self.featureIndex = 0
-        self.featureVal = 0
-        self.samples = len(data)
+        if self.root is None:
+            raise RuntimeError("a loaded tree holds no nodes, it can't be refreshed")
+        if self.root.train is not None:
+            raise RuntimeError("the tree must be fitted before it is refreshed")
         
-        # for visualization purposes
-        self.id = str(DecisionNode.cnt)
-        DecisionNode.cnt += 1
+        missing = [name for name in self.columns if name not in data.columns]
+        if missing:
+            raise ValueError(f"the new samples miss the training columns {missing}")
         
-    def _bestSplit(self):
-        """
-        Get the best split of the decision node.
-            This method is expanded later in the child classes
+        if len(data) == 0:
+            return 0
+        
+        train = TrainingData(data[list(self.columns)], self.label)
+        categories = list(self.categories)
+        for i, (name, ours, theirs) in enumerate(zip(self.columns, self.categories, train.categories)):
+            if (ours is None) != (theirs is None):
+                raise ValueError(f"the column {name} was {'numeric' if ours is None else 'categorical'} "
+                                 f"in training, not in the new samples")
+            if ours is not None:
+                categories[i] = union1d(ours, theirs)
+        train.schema = self.schema
+        
+        regrown = self._refresh(self.root, train, 0, len(train.rows), tol)
+        
+        # the categories of the regrown splits are kept for save
+        self.categories = categories
+        self.__number(self.root)
+        self.flat = FlatTree(self.root, self._leaf_value)
+        self._graph = None
+        self._compiled = None
+        
+        return regrown
+    
+    
+    def _refresh(self, node: DecisionNode, data: TrainingData, start: int, end: int, tol: float):
         """
-        pass
+        Recursively refresh a fitted subtree with the new samples reaching it (see partial_fit)
 
-class DecisionTree(PredictionModel):
-    """
-    Decision tree abstract definition
-    """
-    def __init__(self, maxDepth: int, minSample: int):
+        Args:
+            node (DecisionNode): the root of the fitted subtree
+            data (TrainingData): the new samples
+            start (int): the first position of the subtree samples in data.rows
+            end (int): the position after the last subtree sample in data.rows
+            tol (float): the gain of another split over the split of the node, as a share of
+                the impurity of the new samples, past which the subtree is regrown
+
+        Returns:
+            int: the number of regrown subtrees
         """
-        Decision Tree constructor
+        
+        if end == start:
+            return 0
+        
+        new = type(node)(data, start, end, depth=node.depth)
+        stats = new._statistics()
+        leaf = node.left is None and node.right is None
+        
+        if not leaf and tol is not None and self._drifted(node, new, stats, tol):
+            self._regrow(node, data, start, end)
+            return 1
+        
+        node.stats = stats if node.stats is None else node.stats + stats
+        node.samples += end - start
+        node._updateValue()
+        
+        if leaf:
+            return 0
+        
+        middle = self._partition(node, data, start, end)
+        
+        return self._refresh(node.left, data, start, middle, tol) + self._refresh(node.right, data, middle, end, tol)
+    
+    
+    def _drifted(self, node: DecisionNode, new: DecisionNode, stats, tol: float):
+        """
+        Whether the split of a node has drifted on the new samples reaching it.
+            The new samples must be enough to split, and at least as many as the samples
+            the node was grown on, so a regrown subtree never rests on a smaller sample.
+            The split of the node is scored on the samples it was grown on (its statistics)
+            and on the new samples, the same split on both, so chance alone doesn't tell them apart:
+            it must lose more than tol of its relative impurity reduction, and the best split
+            of the new samples must gain more than tol over it.
 
         Args:
-            maxDepth (int): the max depth of the decision tree
-            minSample (int): the least samples in a node allowed to be split
+            node (DecisionNode): the split node
+            new (DecisionNode): a node of the new samples reaching it
+            stats (np.ndarray): the sufficient statistics of the new samples
+            tol (float): the share of the impurity to lose, and to gain
+
+        Returns:
+            bool: whether the subtree is to be regrown
         """
         
-        self.root : DecisionNode = None
-        self.maxDepth = maxDepth
-        self.minSample = minSample
+        if new.samples < node.samples or not self._can_split(new):
+            return False
         
-        # for visualization purposes
-        self.graph = Digraph(format="png", node_attr={"shape":"rectangle", "fontsize":"8"})
-
-   
-    def _can_split(self, node: DecisionNode):
+        history, impurity = node._impurity(node.stats), new._impurity(stats)
+        if history <= 0 or impurity <= 0:
+            return False
+        
+        data, start, end = new.train, new.start, new.end
+        
+        fitted = 1 - (node.left._impurity(node.left.stats) + node.right._impurity(node.right.stats))/history
+        kept = 1 - self._split_impurity(node, data, start, end)/impurity
+        if fitted - kept <= tol:
+            return False
+        
+        new._bestSplit()
+        if new.featureName == "":
+            return False
+        new.categorical = data.schema[new.featureIndex]
+        
+        return 1 - self._split_impurity(new, data, start, end)/impurity - kept > tol
+    
+    
+    def _partition(self, node: DecisionNode, data: TrainingData, start: int, end: int):
         """
-        Determine if the given node can be split
+        Partition samples in place by the split of a node, left samples first, as _split does.
+            The categories are matched by value, the samples are encoded apart from the training data.
 
         Args:
-            node (DecisionNode): the node to split
+            node (DecisionNode): the split node
+            data (TrainingData): the samples
+            start (int): the first position of the samples in data.rows
+            end (int): the position after the last sample in data.rows
 
         Returns:
-            bool: can we split the node?
+            int: the position of the first right sample in data.rows
         """
         
-        if node is None:
-            return False
-        if (self.maxDepth > node.depth) and (self.minSample <= len(node.data)):
-            return True
-        return False
-             
+        rows = data.rows[start:end]
+        column = data.X[node.featureIndex, rows]
+        categories = data.categories[node.featureIndex]
+        
+        if not node.categorical:
+            goes_left = column < node.featureVal
+        elif categories is None:
+            goes_left = column == node.featureVal
+        else:
+            code = flatnonzero(categories == node.featureVal)
+            goes_left = column == code[0] if len(code) else zeros(len(rows), dtype=bool)
+        
+        return start + _partition_rows(rows, goes_left)[0]
     
-    def _split(self, node: DecisionNode):
+    
+    def _split_impurity(self, node: DecisionNode, data: TrainingData, start: int, end: int):
+        """
+        The total impurity of samples split by the split of a node
+
+        Args:
+            node (DecisionNode): the split node
+            data (TrainingData): the samples
+            start (int): the first position of the samples in data.rows
+            end (int): the position after the last sample in data.rows
+
+        Returns:
+            float: the impurity of the left samples plus the impurity of the right ones
         """
-        Split the node on the most fitting axis
         
+        middle = self._partition(node, data, start, end)
+        sides = [type(node)(data, a, b) for a, b in ((start, middle), (middle, end)) if b > a]
+        
+        return sum(side._impurity(side._statistics()) for side in sides)
+    
+    
+    def _regrow(self, node: DecisionNode, data: TrainingData, start: int, end: int):
+        """
+        Replace a stale subtree by a subtree grown on the new samples reaching it,
+            with the hyperparameters and the schema of the tree
+
         Args:
-            node (DecisionNode): the node to split
+            node (DecisionNode): the root of the stale subtree
+            data (TrainingData): the new samples
+            start (int): the first position of the subtree samples in data.rows
+            end (int): the position after the last subtree sample in data.rows
+        """
+        
+        categorical = [name for name, is_categorical in zip(self.columns, self.schema) if is_categorical]
+        
+        # a tree of a leaf budget doesn't outgrow it, the subtree is given the leaves it replaces
+        maxLeafNodes, stack = None if self.maxLeafNodes is None else 0, [node]
+        while maxLeafNodes is not None and stack:
+            child = stack.pop()
+            if child.left is None and child.right is None:
+                maxLeafNodes += 1
+            else:
+                stack.extend((child.left, child.right))
+        
+        rows, data.rows = data.rows, data.rows[start:end].copy()
+        try:
+            subtree = type(self)(data, self.maxDepth - node.depth, self.minSample, self.maxBins,
+                                 categorical, self.n_jobs, maxLeafNodes=maxLeafNodes, minGain=self.minGain)
+            subtree.fit()
+        finally:
+            data.rows, data.bins, data.schema = rows, None, self.schema
+        
+        depth = node.depth
+        node.__dict__.update(subtree.root.__dict__)
+        
+        stack = [node]
+        while stack:
+            child = stack.pop()
+            child.depth += depth
+            stack.extend(c for c in (child.left, child.right) if c is not None)
+    
+    
+    def _shared_schema(self, data: TrainingData):
         """
+        The schema of the training data, inferred once for all the trees fitted on it in turn
+            with the same categorical features (see _infer_schema)
 
-        # perform node calibration
-        node._bestSplit()
+        Args:
+            data (TrainingData): the training data
 
-        # If the feature is categorial
-        if len(unique(node.data[:,node.featureIndex]))<=2:
-            dfB = node.data[node.data[:,node.featureIndex] == node.featureVal]
-            dfA = node.data[node.data[:,node.featureIndex] != node.featureVal]
-        
-        # Else, if the feature to split of this node is numeric
-        else:
-            dfA = node.data[node.data[:,node.featureIndex] >= node.featureVal]
-            dfB = node.data[node.data[:,node.featureIndex] < node.featureVal]
+        Returns:
+            np.ndarray: True for every categorical column
+        """
         
-        dfA, dfB = DataFrame(dfA, columns=node.data_labels), DataFrame(dfB,columns=node.data_labels)
+        declared = None if self.categorical is None else list(self.categorical)
+        if data.schema is None or data.declared != declared:
+            data.schema = self._infer_schema(data)
+            data.declared = declared
         
-        return dfA, dfB
+        return data.schema
     
     
-    def fit(self):
+    def _infer_schema(self, data: TrainingData):
         """
-        Fit the model to make a Decision Maker
+        Decide once for the whole tree whether every column is categorical.
+            An encoded (non-numeric) column is always categorical, the others are categorical
+            if declared so, or when nothing is declared, if they hold at most two values.
+
+        Args:
+            data (TrainingData): the training data
+
+        Returns:
+            np.ndarray: True for every categorical column
         """
         
-        self._fit(self.root)
-        self.__connect_graph(self.root)
+        if self.categorical is not None:
+            unknown = set(self.categorical) - set(data.labels)
+            if unknown:
+                raise ValueError(f"unknown categorical features: {sorted(unknown)}")
+        
+        schema = empty(len(data.labels), dtype=bool)
+        
+        for i, column in enumerate(data.X):
+            if data.categories[i] is not None:
+                schema[i] = True
+            elif self.categorical is not None:
+                schema[i] = data.labels[i] in self.categorical
+            else:
+                schema[i] = len(unique(column)) <= 2
+        
+        return schema
     
     
     def _fit(self, node: DecisionNode):
@@ -124,11 +1074,119 @@ class DecisionTree(PredictionModel):
             node (DecisionNode): the root of the decition maker
         """
         
+        # left for a subtree worker (see _fitForked)
+        if self._frontier is not None and node.depth >= self._frontierDepth:
+            self._frontier.append(node)
+            return
+        
+        # left in the queue of the best-first growth (see _fitBestFirst)
+        if self._queue is not None:
+            self._enqueue(node)
+            return
+        
+        self._expand(node)
+    
+    
+    def _expand(self, node: DecisionNode):
+        """
+        Split a node, and fit its children
+        
+        Args:
+            node (DecisionNode): the node to split
+        """
+        
         self._split(node)
+        if node.train.bins is not None:
+            self._share_bins(node)
+        if node.left is None and node.right is None:
+            self._made_leaf(node)
         self._fit(node.left)
         self._fit(node.right)
     
     
+    def _made_leaf(self, node: DecisionNode):
+        """
+        Report a node made a leaf to the fit events
+
+        Args:
+            node (DecisionNode): the leaf
+        """
+        
+        if node.train.events is not None:
+            node.train.events.leaf_created(node)
+    
+    
+    def __release(self, node: DecisionNode):
+        """
+        Recursively detach the fitted nodes from the training data,
+            keeping the sufficient statistics of their samples (see partial_fit)
+        
+        Args:
+            node (DecisionNode): the root of the decision maker
+        """
+        
+        if node is None:
+            return
+        
+        # the subtrees grown by the forked workers are released already
+        if node.train is not None:
+            node.stats = node._statistics()
+        node.train = node.hist = None
+        self.__release(node.left)
+        self.__release(node.right)
+    
+    
+    def _leaf_value(self, node: DecisionNode):
+        """
+        The prediction of a node, were it a leaf (kept for inner nodes as well,
+            so the fitted tree can be truncated, see FlatTree.truncate).
+            This method is expanded later in the child classes
+
+        Args:
+            node (DecisionNode): the node
+        """
+        pass
+    
+    
+    def __number(self, node: DecisionNode):
+        """
+        Number the nodes in preorder, so the ids of a fitted tree
+            don't depend on the order the nodes were grown in
+        
+        Args:
+            node (DecisionNode): the root of the decision maker
+        """
+        
+        stack, i = [node], 0
+        while stack:
+            node = stack.pop()
+            node.id = str(i)
+            i += 1
+            stack.extend(child for child in (node.right, node.left) if child is not None)
+    
+    
+    @property
+    def graph(self):
+        """
+        The graph of the Decision Maker, built from the fitted tree on first use.
+            graphviz is only imported here, training and prediction don't need it.
+
+        Returns:
+            graphviz.Digraph: the graph
+        """
+        
+        if self._graph is None:
+            from graphviz import Digraph
+            
+            self._graph = Digraph(format="png", node_attr={"shape":"rectangle", "fontsize":"8"})
+            if self.root is not None:
+                self.__connect_graph(self.root)
+            elif self.flat is not None:
+                self.__connect_flat_graph()
+        
+        return self._graph
+    
+    
     def __connect_graph(self,node: DecisionNode):
         """Recursively connect the graph of the Decision Maker
         
@@ -139,13 +1197,42 @@ class DecisionTree(PredictionModel):
         if node is None:
             return
         
+        self._graph.node(node.id, node.__str__())
+        
         if node.left is not None:
-            self.graph.edge(node.id, node.left.id)
+            self._graph.edge(node.id, node.left.id)
             self.__connect_graph(node.left)
         
         if node.right is not None:
-            self.graph.edge(node.id, node.right.id)
+            self._graph.edge(node.id, node.right.id)
             self.__connect_graph(node.right)
+    
+    
+    def __connect_flat_graph(self):
+        """
+        Connect the graph of a loaded Decision Maker, from its compiled tree.
+            The node ids of both are the same preorder numbering (see __number),
+            and the statements come in the same order as __connect_graph writes them.
+        """
+        
+        flat = self.flat
+        
+        # the edge to a right child is written after the left subtree, right before the child
+        parents = {int(flat.right[i]): i for i in flatnonzero(flat.left >= 0)}
+        
+        for i in range(len(flat.feature)):
+            if i in parents:
+                self._graph.edge(str(parents[i]), str(i))
+            
+            if flat.left[i] < 0:
+                # a regression leaf is rounded as RegressionNode.__str__ does
+                value = flat.value[i]
+                self._graph.node(str(i), f"Predicting: {round(value, 3) if isinstance(value, floating) else value}")
+                continue
+            
+            value = flat.category[i] if flat.categorical[i] else flat.threshold[i]
+            self._graph.node(str(i), f"Spliting on\n{self.columns[flat.feature[i]]}={value}")
+            self._graph.edge(str(i), str(flat.left[i]))
         
     
     def predict(self,samp):
@@ -159,9 +1246,187 @@ class DecisionTree(PredictionModel):
             any: the prediction
         """
         
+        # a loaded tree has no nodes, only the compiled tree
+        if self.root is None and self.flat is not None:
+            return self.predict_batch(DataFrame([samp]) if isinstance(samp, Series) else [samp])[0]
+        
         return self._predict(self.root,samp)
     
     
+    def predict_batch(self, X):
+        """
+        Predict every row of X at once on the compiled tree
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            np.ndarray: the predictions
+        """
+        
+        if self.flat is None:
+            raise RuntimeError("the tree must be fitted before predicting")
+        
+        return self.flat.predict(self._columns(X))
+    
+    
+    def python_source(self):
+        """
+        The source of a python function predicting a single sample with nested if/else
+            (see FlatTree.python_source), to be audited or exported
+
+        Returns:
+            str: the source of the function, taking the tuple of the sample values
+                in the training column order (see columns)
+        """
+        
+        if self.flat is None:
+            raise RuntimeError("the tree must be fitted before generating its source")
+        
+        header = f"# {type(self).__name__}, x holds the values of {asarray(self.columns).tolist()}\n"
+        
+        return header + self.flat.python_source("predict", self.columns)
+    
+    
+    def compile_to_python(self):
+        """
+        Compile the tree into a python function predicting a single sample.
+            Every prediction is a handful of native comparisons, with no recursion and no array call.
+            The function is compiled once, and cached on the tree.
+
+        Returns:
+            callable: the function, taking the tuple of the sample values
+                in the training column order (see columns)
+        """
+        
+        if self._compiled is None:
+            namespace = {}
+            exec(compile(self.python_source(), f"<{type(self).__name__}.compile_to_python>", "exec"), namespace)
+            self._compiled = namespace["predict"]
+        
+        return self._compiled
+    
+    
+    def save(self, path: str):
+        """
+        Save the fitted tree into a directory, as the flat arrays of the compiled tree
+            (see FlatTree.save) and a small JSON header with the hyperparameters,
+            the training columns, the schema and the categories.
+
+        Args:
+            path (str): the directory to save into
+        """
+        
+        if self.flat is None:
+            raise RuntimeError("the tree must be fitted before saving")
+        
+        os.makedirs(path, exist_ok=True)
+        self.flat.save(path)
+        
+        # the category of a categorical node is kept as its code, the categories go in the header
+        codes = empty(len(self.flat.feature), dtype=float64)
+        for i in range(len(codes)):
+            feature = self.flat.feature[i]
+            if not self.flat.categorical[i]:
+                codes[i] = 0
+            elif self.categories[feature] is None:
+                codes[i] = self.flat.category[i]
+            else:
+                code = flatnonzero(self.categories[feature] == self.flat.category[i])
+                if len(code) == 0:
+                    raise ValueError(f"the category {self.flat.category[i]!r} of node {i} "
+                                     f"is not a category of {self.columns[feature]}")
+                codes[i] = code[0]
+        save(os.path.join(path, "category.npy"), codes)
+        
+        header = {
+            "model": type(self).__name__,
+            "maxDepth": self.maxDepth,
+            "minSample": self.minSample,
+            "maxBins": self.maxBins,
+            "categorical": self.categorical,
+            "n_jobs": self.n_jobs,
+            "maxLeafNodes": self.maxLeafNodes,
+            "minGain": self.minGain,
+            "columns": asarray(self.columns).tolist(),
+            "schema": asarray(self.schema).tolist(),
+            "categories": [None if c is None else c.tolist() for c in self.categories],
+        }
+        with open(os.path.join(path, "header.json"), "w") as f:
+            json.dump(header, f)
+    
+    
+    @classmethod
+    def load(cls, path: str, mmap: bool=True):
+        """
+        Load a tree saved by save().
+            The loaded tree predicts on its compiled arrays, it holds no nodes.
+
+        Args:
+            path (str): the directory the tree was saved into
+            mmap (bool, optional): memory-map the arrays instead of reading them. Defaults to True.
+
+        Returns:
+            DecisionTree: the loaded tree
+        """
+        
+        with open(os.path.join(path, "header.json")) as f:
+            header = json.load(f)
+        
+        if header["model"] != cls.__name__:
+            raise ValueError(f"{path} holds a {header['model']}, not a {cls.__name__}")
+        
+        tree = cls.__new__(cls)
+        DecisionTree.__init__(tree, header["maxDepth"], header["minSample"], header["maxBins"],
+                              header["categorical"], header["n_jobs"],
+                              header.get("maxLeafNodes"), header.get("minGain", 0.0))
+        tree.columns = asarray(header["columns"], dtype=object)
+        tree.schema = asarray(header["schema"], dtype=bool)
+        tree.categories = [None if c is None else asarray(c) for c in header["categories"]]
+        
+        # the categories of the categorical nodes are decoded back (one value per node)
+        flat = FlatTree.load(path, mmap)
+        codes = load(os.path.join(path, "category.npy"))
+        for i in flat.categorical.nonzero()[0]:
+            feature = flat.feature[i]
+            flat.category[i] = codes[i] if tree.categories[feature] is None \
+                else tree.categories[feature][int(codes[i])]
+        tree.flat = flat
+        
+        return tree
+    
+    
+    def _score(self, data: DataFrame, predicted):
+        """
+        Score predictions against the true labels.
+            This method is expanded later in the child classes
+
+        Args:
+            data (pd.DataFrame): the samples, holding the true labels
+            predicted (np.ndarray): the predictions of the samples
+        """
+        pass
+    
+    
+    def _columns(self, X):
+        """
+        Split the samples into one array per training data column
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            list: the column arrays, None for a training column missing from a DataFrame
+        """
+        
+        if isinstance(X, DataFrame):
+            return [X[name].values if name in X.columns else None for name in self.columns]
+        
+        return list(asarray(X).T)
+    
+    
     def _predict(self, node: DecisionNode, samp):
         """
         Recursive prediction method
@@ -176,17 +1441,17 @@ class DecisionTree(PredictionModel):
         """
         
         # If the feature is categorial
-        if len(unique(node.data[:,node.featureIndex]))==2:
+        if node.categorical:
             if samp[node.featureIndex] == node.featureVal:
                 return self._predict(node.left, samp)
             else:
                 return self._predict(node.right, samp)
-        # Else, if the feature is numeric
+        # Else, if the feature is numeric, a NaN goes right as in training
         else:
-            if samp[node.featureName] >= node.featureVal:
-                return self._predict(node.right, samp)
-            else:
+            if samp[node.featureName] < node.featureVal:
                 return self._predict(node.left, samp)
+            else:
+                return self._predict(node.right, samp)
     
     
     def display(self,in_console=True):
@@ -198,13 +1463,16 @@ class DecisionTree(PredictionModel):
         """
         
         if in_console:
+            from IPython.display import display
             display(self.graph)
         else:
             self.graph.view("decisionTree.dot")
             
-            
+    
+    @staticmethod
     def is_notebook() -> bool:
         try:
+            from IPython import get_ipython
             shell = get_ipython().__class__.__name__
             if shell == 'ZMQInteractiveShell':
                 return True   # Jupyter notebook or qtconsole
@@ -212,5 +1480,5 @@ class DecisionTree(PredictionModel):
                 return False  # Terminal running IPython
             else:
                 return False  # Other type (?)
-        except NameError:
+        except (NameError, ImportError):
             return False      # Probably standard Python interpreter
@@ -0,0 +1,502 @@
+import os
+from copy import copy
+from math import isfinite
+from numpy import load, save, ndarray, array, asarray, zeros, ones, empty, arange, where, unique, flatnonzero, \
+    concatenate, column_stack, cumsum, tile, repeat, searchsorted, intp, float64
+
+
+class FlatTree:
+    """
+    Compiled Tree Definition.
+        The fitted nodes are laid out in parallel arrays indexed by node id,
+        so a whole batch of samples is routed level by level with vectorized
+        indexing, without touching the nodes or the training data.
+    """
+    def __init__(self, root, leaf_value):
+        """
+        Compiled Tree Constructor
+
+        Args:
+            root (DecisionNode): the root of the fitted decision maker
+            leaf_value (callable): maps a node to its prediction, were it a leaf
+        """
+
+        features, thresholds, categories, categorical = [], [], [], []
+        lefts, rights, values, depths, samples = [], [], [], [], []
+
+        # preorder walk, a child id is only known once the child is visited
+        stack = [(root, -1, False)]
+        while stack:
+            node, parent, is_left = stack.pop()
+            i = len(features)
+            if parent >= 0:
+                (lefts if is_left else rights)[parent] = i
+
+            leaf = node.left is None and node.right is None
+            features.append(0 if leaf else node.featureIndex)
+            categorical.append(not leaf and node.categorical)
+            thresholds.append(0.0 if leaf or node.categorical else float(node.featureVal))
+            categories.append(node.featureVal if not leaf and node.categorical else None)
+            lefts.append(-1)
+            rights.append(-1)
+            values.append(leaf_value(node))
+            depths.append(node.depth)
+            samples.append(node.samples)
+
+            if not leaf:
+                stack.append((node.right, i, False))
+                stack.append((node.left, i, True))
+
+        self.feature = array(features, dtype=intp)
+        self.threshold = array(thresholds, dtype=float64)
+        self.category = empty(len(categories), dtype=object)
+        self.category[:] = categories
+        self.categorical = array(categorical, dtype=bool)
+        self.left = array(lefts, dtype=intp)
+        self.right = array(rights, dtype=intp)
+        self.value = array(values)
+
+        # the training statistics of every node, for truncation (see truncate)
+        self.depth = array(depths, dtype=intp)
+        self.samples = array(samples, dtype=intp)
+
+
+    # the typed arrays of the tree, saved as is (see save)
+    ARRAYS = ("feature", "threshold", "categorical", "left", "right", "value", "depth", "samples")
+
+
+    def save(self, directory: str):
+        """
+        Save the typed arrays of the tree, one .npy file each.
+            The categories of the categorical nodes are python objects, they are left to the caller.
+
+        Args:
+            directory (str): the directory to save into
+        """
+
+        for name in FlatTree.ARRAYS:
+            save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool=True):
+        """
+        Load the typed arrays of a tree saved by save()
+
+        Args:
+            directory (str): the directory the tree was saved into
+            mmap (bool, optional): memory-map the arrays instead of reading them. Defaults to True.
+
+        Returns:
+            FlatTree: the tree, with no categories yet
+        """
+
+        tree = cls.__new__(cls)
+        for name in FlatTree.ARRAYS:
+            setattr(tree, name, load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None))
+
+        tree.category = empty(len(tree.feature), dtype=object)
+
+        return tree
+
+
+    def _levels(self, columns: list):
+        """
+        Route every sample down the tree, one level at a time
+
+        Args:
+            columns (list): one array per training data column, holding the samples values
+
+        Yields:
+            np.ndarray: the node id of every sample, after every level
+        """
+
+        n = len(next(c for c in columns if c is not None))
+        node = zeros(n, dtype=intp)
+        active = arange(n)
+        yield node
+
+        while len(active):
+            at = node[active]
+            inner = self.left[at] >= 0
+            active, at = active[inner], at[inner]
+            if not len(active):
+                break
+
+            feature = self.feature[at]
+            goes_left = empty(len(active), dtype=bool)
+
+            # a level visits few features, each one is gathered from its own typed column
+            for f in unique(feature):
+                on = flatnonzero(feature == f)
+                x, nodes = columns[f][active[on]], at[on]
+                cat = self.categorical[nodes]
+
+                # same routing as training, so a NaN goes right on any feature
+                # a text column only meets categorical nodes, its values can't be ordered
+                if cat.any():
+                    goes_left[on[cat]] = x[cat] == self.category[nodes[cat]]
+                if not cat.all():
+                    goes_left[on[~cat]] = x[~cat] < self.threshold[nodes[~cat]]
+
+            node = node.copy()
+            node[active] = where(goes_left, self.left[at], self.right[at])
+            yield node
+
+
+    def apply(self, columns: list):
+        """
+        Route every sample down to its leaf
+
+        Args:
+            columns (list): one array per training data column, holding the samples values
+
+        Returns:
+            np.ndarray: the leaf id of every sample
+        """
+
+        for node in self._levels(columns):
+            pass
+
+        return node
+
+
+    def path(self, columns: list):
+        """
+        Route every sample down to its leaf, keeping the visited nodes
+
+        Args:
+            columns (list): one array per training data column, holding the samples values
+
+        Returns:
+            np.ndarray: the node id of every sample at every depth, shaped (samples, levels).
+                A sample that reached its leaf stays on it.
+        """
+
+        return column_stack(list(self._levels(typed(columns))))
+
+
+    def truncate(self, maxDepth: int, minSample: int):
+        """
+        Derive the tree that would have been grown with a lower maxDepth or a higher minSample.
+            Split search doesn't depend on them, so that tree is this one with the nodes
+            it would not split turned into leaves.
+
+        Args:
+            maxDepth (int): the max depth of the truncated tree
+            minSample (int): the least samples in a node allowed to be split
+
+        Returns:
+            FlatTree: the truncated tree, sharing the node ids of this one
+        """
+
+        cut = (self.depth >= maxDepth) | (self.samples < minSample)
+
+        tree = copy(self)
+        tree.left = where(cut, -1, self.left)
+        tree.right = where(cut, -1, self.right)
+
+        return tree
+
+
+    def reachable(self):
+        """
+        The nodes reachable from the root
+
+        Returns:
+            np.ndarray: the reachable node ids, level by level
+        """
+
+        level, levels = array([0]), []
+        while len(level):
+            levels.append(level)
+            inner = level[self.left[level] >= 0]
+            level = concatenate((self.left[inner], self.right[inner]))
+
+        return concatenate(levels)
+
+
+    def predict(self, columns: list):
+        """
+        Predict every sample of the batch
+
+        Args:
+            columns (list): one array per training data column, holding the samples values.
+                A column the tree never splits on may be None.
+
+        Returns:
+            np.ndarray: the predictions
+        """
+
+        return self.value[self.apply(typed(columns))]
+
+
+    # python refuses to nest blocks deeper than 100 levels
+    MAX_SOURCE_DEPTH = 90
+
+
+    def python_source(self, name: str="predict", columns: list=None):
+        """
+        Generate the source of a python function predicting a single sample with nested if/else,
+            routing as predict does: a NaN goes right on any feature.
+
+        Args:
+            name (str, optional): the function name. Defaults to "predict".
+            columns (list, optional): the training column names, commented on every split.
+                Defaults to None.
+
+        Returns:
+            str: the source of the function, taking the tuple of the sample values
+                in the training column order
+        """
+
+        if int(self.depth[self.reachable()].max()) > FlatTree.MAX_SOURCE_DEPTH:
+            raise ValueError(f"the tree is deeper than {FlatTree.MAX_SOURCE_DEPTH} levels, python can't nest it")
+
+        lines = [f"def {name}(x):"]
+        stack = [(0, 1)]
+        while stack:
+            node, indent = stack.pop()
+            pad = "    "*indent
+
+            # an "else:" marker, pushed between the two branches of a split
+            if node < 0:
+                lines.append("    "*(indent - 1) + "else:")
+                continue
+
+            if self.left[node] < 0:
+                lines.append(f"{pad}return {_literal(self.value[node])}")
+                continue
+
+            feature = int(self.feature[node])
+            comment = "" if columns is None else "  # " + " ".join(str(columns[feature]).split())
+            if self.categorical[node]:
+                lines.append(f"{pad}if x[{feature}] == {_literal(self.category[node])}:{comment}")
+                first, second = self.left[node], self.right[node]
+            else:
+                lines.append(f"{pad}if x[{feature}] < {_literal(self.threshold[node])}:{comment}")
+                first, second = self.left[node], self.right[node]
+
+            stack.extend(((int(second), indent + 1), (-1, indent + 1), (int(first), indent + 1)))
+
+        return "\n".join(lines) + "\n"
+
+
+def _literal(value):
+    """
+    The python literal of a tree value
+
+    Args:
+        value (any): a threshold, category or prediction, possibly a numpy scalar
+
+    Returns:
+        str: the literal
+    """
+
+    value = getattr(value, "item", lambda: value)()
+    if isinstance(value, float) and not isfinite(value):
+        return f"float({str(value)!r})"
+
+    return repr(value)
+
+
+class StackedTrees:
+    """
+    Stacked Trees Definition.
+        The compiled trees of an ensemble are concatenated into a single set of node arrays,
+        every tree offset by the position of its root, so a whole batch of samples is routed
+        down all the trees in lock-step, one level at a time, without a python call per tree.
+        Every leaf holds a numeric output, and the prediction is the weighted sum of
+        the outputs of the leaves a sample reaches, plus a bias.
+    """
+    def __init__(self, trees: list, outputs: list=None, weights=None, bias: float=0.0):
+        """
+        Stacked Trees Constructor
+
+        Args:
+            trees (list): the compiled trees (see FlatTree)
+            outputs (list, optional): the numeric output of every node of every tree,
+                None for the tree values themselves. Defaults to None.
+            weights (np.ndarray, optional): the weight of every tree. Defaults to None (all 1).
+            bias (float, optional): added to every prediction. Defaults to 0.0.
+        """
+
+        if not trees:
+            raise ValueError("at least one tree is needed to stack")
+        if outputs is None:
+            outputs = [tree.value for tree in trees]
+
+        sizes = array([len(tree.feature) for tree in trees], dtype=intp)
+        self.roots = concatenate(([0], cumsum(sizes)[:-1])).astype(intp)
+        ids = arange(sizes.sum())
+
+        # the children ids are offset by the root of their tree,
+        # a leaf is its own child, so every sample can take the same number of steps
+        left = concatenate([where(tree.left >= 0, tree.left + root, -1) for tree, root in zip(trees, self.roots)])
+        right = concatenate([where(tree.right >= 0, tree.right + root, -1) for tree, root in zip(trees, self.roots)])
+        leaf = left < 0
+        self.left, self.right = where(leaf, ids, left), where(leaf, ids, right)
+
+        # the deepest leaf sets the number of steps
+        self.steps = int(max(tree.depth.max() for tree in trees))
+
+        self.threshold = concatenate([tree.threshold for tree in trees])
+        self.categorical = concatenate([tree.categorical for tree in trees]) & ~leaf
+        feature = concatenate([tree.feature for tree in trees])
+        category = concatenate([tree.category for tree in trees])
+
+        # the features split on, gathered into the rows of a single float matrix (see _matrix)
+        self.features = unique(feature[~leaf])
+        self.row = searchsorted(self.features, feature).clip(0, max(len(self.features) - 1, 0))
+
+        # a category is compared as a float code: the number itself, or its position in the
+        # sorted categories of a text feature (see _matrix)
+        self.vocabulary = {}
+        self.code = zeros(len(ids), dtype=float64)
+        for f in self.features:
+            on = flatnonzero(self.categorical & (feature == f))
+            try:
+                self.code[on] = asarray(category[on], dtype=float64)
+            except (ValueError, TypeError):
+                self.vocabulary[f] = unique(category[on].astype(str))
+                self.code[on] = searchsorted(self.vocabulary[f], category[on].astype(str))
+
+        self.value = concatenate([asarray(output, dtype=float64) for output in outputs])
+        self.weights = ones(len(trees)) if weights is None else asarray(weights, dtype=float64)
+        self.bias = bias
+
+
+    # the largest number of (sample, tree) pairs routed at once, to bound the routing memory
+    BATCH_PAIRS = 1 << 21
+
+
+    def _matrix(self, columns: list):
+        """
+        Gather the features split on into a single float matrix.
+            A text feature is replaced by the code of its categories, -1 for an unseen one.
+
+        Args:
+            columns (list): one array per training data column, holding the samples values
+
+        Returns:
+            np.ndarray: the feature values, shaped (features split on, samples)
+        """
+
+        n = len(next(c for c in columns if c is not None))
+        X = empty((max(len(self.features), 1), n), dtype=float64)
+
+        for k, f in enumerate(self.features):
+            column = asarray(columns[f])
+            if f not in self.vocabulary:
+                X[k] = column
+                continue
+
+            vocabulary = self.vocabulary[f]
+            column = column.astype(str)
+            codes = searchsorted(vocabulary, column).clip(0, len(vocabulary) - 1)
+            X[k] = where(vocabulary[codes] == column, codes, -1)
+
+        return X
+
+
+    def _route(self, X: ndarray):
+        """
+        Route every sample of a matrix down every tree
+
+        Args:
+            X (np.ndarray): the feature values (see _matrix)
+
+        Returns:
+            np.ndarray: the leaf id of every sample in every tree, shaped (samples, trees)
+        """
+
+        n, trees = X.shape[1], len(self.roots)
+        node = tile(self.roots, n)
+        position = repeat(arange(n), trees)
+
+        X = X.ravel()
+        for _ in range(self.steps):
+            x = X[self.row[node]*n + position]
+
+            # same routing as FlatTree, so a NaN goes right on any feature
+            goes_left = where(self.categorical[node], x == self.code[node], x < self.threshold[node])
+            node = where(goes_left, self.left[node], self.right[node])
+
+        return node.reshape(n, trees)
+
+
+    def _batches(self, columns: list):
+        """
+        Split the samples into batches of a bounded number of (sample, tree) pairs
+
+        Args:
+            columns (list): one array per training data column, holding the samples values
+
+        Yields:
+            tuple: the slice of every batch and its feature matrix
+        """
+
+        X = self._matrix(columns)
+        step = max(1, StackedTrees.BATCH_PAIRS // len(self.roots))
+
+        for start in range(0, X.shape[1], step):
+            yield slice(start, start + step), X[:, start:start + step]
+
+
+    def apply(self, columns: list):
+        """
+        Route every sample down to its leaf in every tree
+
+        Args:
+            columns (list): one array per training data column, holding the samples values
+
+        Returns:
+            np.ndarray: the leaf id of every sample in every tree, shaped (samples, trees)
+        """
+
+        return concatenate([self._route(X) for _, X in self._batches(columns)])
+
+
+    def predict(self, columns: list):
+        """
+        Predict every sample of the batch, as the weighted sum of the tree outputs
+
+        Args:
+            columns (list): one array per training data column, holding the samples values.
+                A column no tree splits on may be None.
+
+        Returns:
+            np.ndarray: the predictions
+        """
+
+        n = len(next(c for c in columns if c is not None))
+        predicted = empty(n, dtype=float64)
+
+        for batch, X in self._batches(columns):
+            predicted[batch] = self.value[self._route(X)] @ self.weights + self.bias
+
+        return predicted
+
+
+def typed(columns: list):
+    """
+    Cast the numeric columns to float, so they are compared without python objects
+
+    Args:
+        columns (list): one array per training data column, or None
+
+    Returns:
+        list: the columns, as float where possible
+    """
+
+    casted = []
+    for column in columns:
+        if column is not None:
+            column = asarray(column)
+            try:
+                column = column.astype(float)
+            except (ValueError, TypeError):
+                pass
+        casted.append(column)
+
+    return casted
@@ -0,0 +1,234 @@
+from numpy import ndarray, unique, quantile, linspace, searchsorted, cumsum, \
+    flatnonzero, argmin, arange, minimum, empty, uint8, inf, isnan
+
+
+class FeatureBins:
+    """
+    Histogram Binning Definition.
+        Every column of the training data is quantized once into at most
+        max_bins bins, so split search scans bins instead of rows.
+    """
+    def __init__(self, data: ndarray, max_bins: int, target: ndarray, schema: ndarray):
+        """
+        Feature Bins Constructor
+
+        Args:
+            data (np.ndarray): the encoded training data, one row per feature (see TrainingData.X)
+            max_bins (int): the maximal number of bins per feature (up to 255)
+            target (np.ndarray): the per-sample target the histograms accumulate
+            schema (np.ndarray): whether every column is categorical (see DecisionTree.schema)
+        """
+
+        if not 2 <= max_bins <= 255:
+            raise ValueError(f"max_bins must be between 2 and 255, got {max_bins}")
+
+        self.max_bins = max_bins
+        self.target = target
+        self.schema = schema
+
+        # codes are stored feature-major, so a node gathers contiguous rows of a feature
+        self.codes = empty(data.shape, dtype=uint8)
+        self.thresholds = []
+        self.categories = []
+
+        for i in range(data.shape[0]):
+            if schema[i]:
+                self.codes[i], thresholds, categories = self._encode(data[i])
+            else:
+                (self.codes[i], thresholds), categories = self._quantize(data[i]), None
+            self.thresholds.append(thresholds)
+            self.categories.append(categories)
+
+        self.n_bins = max(len(t) for t in self.thresholds) + 1
+        self.offsets = arange(data.shape[0]) * self.n_bins
+
+
+    def _encode(self, column: ndarray):
+        """
+        Encode a single categorical column, every category is a bin of its own.
+            Past max_bins categories, the remaining ones share the last bin.
+
+        Args:
+            column (np.ndarray): the column values
+
+        Returns:
+            tuple: the bin code of every sample, the thresholds between the bins
+                and the category of every bin holding a single category
+        """
+
+        values, codes = unique(column, return_inverse=True)
+        categories = values if len(values) <= self.max_bins else values[:self.max_bins - 1]
+
+        return minimum(codes, self.max_bins - 1), values[1:self.max_bins], categories
+
+
+    def _quantize(self, column: ndarray):
+        """
+        Quantize a single numeric column into bins.
+            The threshold between bins b and b+1 is chosen so that
+            "x >= threshold" holds exactly for the samples of bins above b.
+            A NaN is binned with the largest values, so like in the exact
+            search it always falls on the right side of a split.
+
+        Args:
+            column (np.ndarray): the column values
+
+        Returns:
+            tuple: the bin code of every sample and the thresholds between the bins
+        """
+
+        known = column[~isnan(column)]
+        values = unique(known)
+
+        # few distinct values, every value is a bin of its own
+        if len(values) <= self.max_bins:
+            return minimum(searchsorted(values, column), max(len(values) - 1, 0)), (values[:-1] + values[1:])/2
+
+        edges = unique(quantile(known, linspace(0, 1, self.max_bins + 1)[1:-1]))
+        return searchsorted(edges, column, side="right"), edges
+
+
+    def flat_index(self, rows: ndarray):
+        """
+        Flatten the (feature, bin) pair of every sample of the given rows
+
+        Args:
+            rows (np.ndarray): the row indices
+
+        Returns:
+            np.ndarray: the flat index, shaped (features, rows)
+        """
+
+        return self.offsets[:, None] + self.codes[:, rows]
+
+
+def gini_histogram_split(hist: ndarray):
+    """
+    Find the best bin boundary of a feature by the gini impurity
+
+    Args:
+        hist (np.ndarray): the class counts of every bin, shaped (bins, classes)
+
+    Returns:
+        tuple: the best gini impurity and the first bin of the right side,
+            (inf, 0) if all the samples fall in the same bin
+    """
+
+    left_counts = cumsum(hist, axis=0)[:-1]
+    right_counts = hist.sum(axis=0) - left_counts
+
+    left_n = left_counts.sum(axis=1)
+    right_n = right_counts.sum(axis=1)
+
+    candidates = flatnonzero((left_n > 0) & (right_n > 0))
+    if len(candidates) == 0:
+        return inf, 0
+
+    left_counts, right_counts = left_counts[candidates], right_counts[candidates]
+    left_n, right_n = left_n[candidates], right_n[candidates]
+
+    left_gini = 1 - ((left_counts / left_n[:, None])**2).sum(axis=1)
+    right_gini = 1 - ((right_counts / right_n[:, None])**2).sum(axis=1)
+
+    gini = (right_n*right_gini + left_n*left_gini)/(left_n + right_n)
+
+    best = argmin(gini)
+
+    return gini[best], candidates[best] + 1
+
+
+def ssr_histogram_split(hist: ndarray):
+    """
+    Find the best bin boundary of a feature by the sum of squared residuals
+
+    Args:
+        hist (np.ndarray): the count, sum and sum of squares of the target
+            in every bin, shaped (bins, 3)
+
+    Returns:
+        tuple: the best ssr value and the first bin of the right side,
+            (inf, 0) if all the samples fall in the same bin
+    """
+
+    left = cumsum(hist, axis=0)[:-1]
+    right = hist.sum(axis=0) - left
+
+    candidates = flatnonzero((left[:, 0] > 0) & (right[:, 0] > 0))
+    if len(candidates) == 0:
+        return inf, 0
+
+    left, right = left[candidates], right[candidates]
+
+    ssr = (left[:, 2] - left[:, 1]**2/left[:, 0]) + (right[:, 2] - right[:, 1]**2/right[:, 0])
+
+    best = argmin(ssr)
+
+    return ssr[best], candidates[best] + 1
+
+
+def gini_histogram_category_split(hist: ndarray, n_categories: int):
+    """
+    Find the best category bin of a categorical feature by the gini impurity.
+        Every bin is scored against the rest of the bins.
+
+    Args:
+        hist (np.ndarray): the class counts of every bin, shaped (bins, classes)
+        n_categories (int): the number of leading bins holding a single category
+
+    Returns:
+        tuple: the best gini impurity and the bin sent to the left,
+            (inf, 0) if all the samples fall in the same bin
+    """
+
+    left_counts = hist[:n_categories]
+    right_counts = hist.sum(axis=0) - left_counts
+
+    left_n = left_counts.sum(axis=1)
+    right_n = right_counts.sum(axis=1)
+
+    candidates = flatnonzero((left_n > 0) & (right_n > 0))
+    if len(candidates) == 0:
+        return inf, 0
+
+    left_counts, right_counts = left_counts[candidates], right_counts[candidates]
+    left_n, right_n = left_n[candidates], right_n[candidates]
+
+    left_gini = 1 - ((left_counts / left_n[:, None])**2).sum(axis=1)
+    right_gini = 1 - ((right_counts / right_n[:, None])**2).sum(axis=1)
+
+    gini = (right_n*right_gini + left_n*left_gini)/(left_n + right_n)
+
+    best = argmin(gini)
+
+    return gini[best], candidates[best]
+
+
+def ssr_histogram_category_split(hist: ndarray, n_categories: int):
+    """
+    Find the best category bin of a categorical feature by the sum of squared residuals.
+        Every bin is scored against the rest of the bins.
+
+    Args:
+        hist (np.ndarray): the count, sum and sum of squares of the target
+            in every bin, shaped (bins, 3)
+        n_categories (int): the number of leading bins holding a single category
+
+    Returns:
+        tuple: the best ssr value and the bin sent to the left,
+            (inf, 0) if all the samples fall in the same bin
+    """
+
+    left = hist[:n_categories]
+    right = hist.sum(axis=0) - left
+
+    candidates = flatnonzero((left[:, 0] > 0) & (right[:, 0] > 0))
+    if len(candidates) == 0:
+        return inf, 0
+
+    left, right = left[candidates], right[candidates]
+
+    ssr = (left[:, 2] - left[:, 1]**2/left[:, 0]) + (right[:, 2] - right[:, 1]**2/right[:, 0])
+
+    best = argmin(ssr)
+
+    return ssr[best], candidates[best]
@@ -0,0 +1,239 @@
+from numpy import ndarray, argsort, cumsum, flatnonzero, argmin, arange, unique, bincount, errstate, inf, \
+    count_nonzero, intp
+
+
+def _sorted_candidates(x: ndarray):
+    """
+    Sort a feature column once and find every distinct split point
+
+    Args:
+        x (np.ndarray): the numeric feature column
+
+    Returns:
+        tuple: the sorting order, the sorted column and the candidate positions,
+            where position i means "split between sorted rows i and i+1"
+    """
+
+    order = argsort(x, kind="stable")
+    xs = x[order]
+
+    # a threshold only exists between two different adjacent values
+    candidates = flatnonzero(xs[:-1] < xs[1:])
+
+    return order, xs, candidates
+
+
+def _category_codes(x: ndarray, n_categories: int=None):
+    """
+    Code the categories of a categorical feature column
+
+    Args:
+        x (np.ndarray): the categorical feature column
+        n_categories (int, optional): the number of categories of an encoded column,
+            whose values are already their codes. Defaults to None (the distinct values are sorted).
+
+    Returns:
+        tuple: the categories, the code of every sample and the number of samples of every category
+    """
+
+    if n_categories is None:
+        values, codes = unique(x, return_inverse=True)
+    else:
+        # the codes are counted straight away, a category missing from the node counts no sample
+        values, codes = arange(n_categories, dtype=x.dtype), x.astype(intp)
+
+    return values, codes, bincount(codes, minlength=len(values))
+
+
+def _weighted_gini(left_counts: ndarray, right_counts: ndarray, left_n: ndarray, right_n: ndarray, total):
+    """
+    Score the candidate splits by the gini impurity of both sides, weighted by their size.
+        A candidate leaving a side with no weight at all is not a split.
+
+    Args:
+        left_counts (np.ndarray): the class counts of the left side of every candidate
+        right_counts (np.ndarray): the class counts of the right side of every candidate
+        left_n (np.ndarray): the size of the left side of every candidate
+        right_n (np.ndarray): the size of the right side of every candidate
+        total (float): the size of the node
+
+    Returns:
+        np.ndarray: the gini impurity of every candidate
+    """
+
+    with errstate(divide="ignore", invalid="ignore"):
+        left_gini = 1 - ((left_counts / left_n[:, None])**2).sum(axis=1)
+        right_gini = 1 - ((right_counts / right_n[:, None])**2).sum(axis=1)
+
+        gini = (right_n*right_gini + left_n*left_gini)/total
+
+    gini[(left_n <= 0) | (right_n <= 0)] = inf
+
+    return gini
+
+
+def gini_numeric_split(x: ndarray, y: ndarray, n_classes: int, w: ndarray=None):
+    """
+    Find the best threshold of a numeric feature by the gini impurity.
+        The feature is sorted once, the class counts of the left side are swept
+        with a cumulative sum, and every distinct threshold is scored at once.
+
+    Args:
+        x (np.ndarray): the numeric feature column
+        y (np.ndarray): the class codes of the samples, in range(n_classes)
+        n_classes (int): the number of classes
+        w (np.ndarray, optional): the sample weights, counted instead of the samples. Defaults to None.
+
+    Returns:
+        tuple: the best gini impurity, its threshold and the number of thresholds scored,
+            (inf, inf, 0) if the feature holds a single value
+    """
+
+    n = len(x)
+    order, xs, candidates = _sorted_candidates(x)
+    if len(candidates) == 0:
+        return inf, inf, 0
+
+    # one-hot class matrix of the sorted samples, swept from left to right
+    onehot = y[order, None] == arange(n_classes)
+    if w is not None:
+        onehot = onehot * w[order, None]
+    left_counts = cumsum(onehot, axis=0)[candidates]
+    right_counts = onehot.sum(axis=0) - left_counts
+
+    if w is None:
+        left_n, total = (candidates + 1).astype(float), n
+    else:
+        left_n, total = left_counts.sum(axis=1), w.sum()
+    right_n = total - left_n
+
+    gini = _weighted_gini(left_counts, right_counts, left_n, right_n, total)
+
+    best = argmin(gini)
+    i = candidates[best]
+
+    return gini[best], (xs[i] + xs[i+1])/2, len(candidates)
+
+
+def ssr_numeric_split(x: ndarray, y: ndarray):
+    """
+    Find the best threshold of a numeric feature by the sum of squared residuals.
+        The feature is sorted once, and the ssr of both sides of every distinct
+        threshold comes from running sums of y and y^2 in a single sweep.
+
+    Args:
+        x (np.ndarray): the numeric feature column
+        y (np.ndarray): the numeric label of the samples
+
+    Returns:
+        tuple: the best ssr value, its threshold and the number of thresholds scored,
+            (inf, inf, 0) if the feature holds a single value
+    """
+
+    n = len(x)
+    order, xs, candidates = _sorted_candidates(x)
+    if len(candidates) == 0:
+        return inf, inf, 0
+
+    # centering the label keeps the running sums of squares well conditioned
+    ys = y[order] - y.mean()
+    sums = cumsum(ys)
+    squares = cumsum(ys**2)
+
+    left_n = (candidates + 1).astype(float)
+    right_n = n - left_n
+
+    left_sum, left_squares = sums[candidates], squares[candidates]
+    right_sum, right_squares = sums[-1] - left_sum, squares[-1] - left_squares
+
+    ssr = (left_squares - left_sum**2/left_n) + (right_squares - right_sum**2/right_n)
+
+    best = argmin(ssr)
+    i = candidates[best]
+
+    return ssr[best], (xs[i] + xs[i+1])/2, len(candidates)
+
+
+def gini_categorical_split(x: ndarray, y: ndarray, n_classes: int, w: ndarray=None, n_categories: int=None):
+    """
+    Find the best category of a categorical feature by the gini impurity.
+        Every category is scored against the rest of the categories at once
+        from the class counts of each category.
+
+    Args:
+        x (np.ndarray): the categorical feature column
+        y (np.ndarray): the class codes of the samples, in range(n_classes)
+        n_classes (int): the number of classes
+        w (np.ndarray, optional): the sample weights, counted instead of the samples. Defaults to None.
+        n_categories (int, optional): the number of categories of an encoded column (see _category_codes).
+            Defaults to None.
+
+    Returns:
+        tuple: the best gini impurity, the category sent to the left and the number
+            of categories scored, (inf, None, n) if the feature holds a single category
+    """
+
+    n = len(x)
+    values, codes, sizes = _category_codes(x, n_categories)
+    present = count_nonzero(sizes)
+    if present < 2:
+        return inf, None, present
+
+    # a missing category leaves an empty side, which _weighted_gini rules out
+    left_counts = bincount(codes*n_classes + y, weights=w, minlength=len(values)*n_classes) \
+        .reshape(len(values), n_classes)
+    right_counts = left_counts.sum(axis=0) - left_counts
+
+    left_n = left_counts.sum(axis=1).astype(float)
+    total = n if w is None else w.sum()
+    right_n = total - left_n
+
+    gini = _weighted_gini(left_counts, right_counts, left_n, right_n, total)
+
+    best = argmin(gini)
+
+    return gini[best], values[best], present
+
+
+def ssr_categorical_split(x: ndarray, y: ndarray, n_categories: int=None):
+    """
+    Find the best category of a categorical feature by the sum of squared residuals.
+        Every category is scored against the rest of the categories at once
+        from the count, sum and sum of squares of y in each category.
+
+    Args:
+        x (np.ndarray): the categorical feature column
+        y (np.ndarray): the numeric label of the samples
+        n_categories (int, optional): the number of categories of an encoded column (see _category_codes).
+            Defaults to None.
+
+    Returns:
+        tuple: the best ssr value, the category sent to the left and the number
+            of categories scored, (inf, None, n) if the feature holds a single category
+    """
+
+    n = len(x)
+    values, codes, sizes = _category_codes(x, n_categories)
+    present = count_nonzero(sizes)
+    if present < 2:
+        return inf, None, present
+
+    # centering the label keeps the sums of squares well conditioned for large values
+    yc = y - y.mean()
+
+    left_n = sizes.astype(float)
+    left_sum = bincount(codes, weights=yc, minlength=len(values))
+    left_squares = bincount(codes, weights=yc**2, minlength=len(values))
+
+    right_n = n - left_n
+    right_sum, right_squares = left_sum.sum() - left_sum, left_squares.sum() - left_squares
+
+    with errstate(divide="ignore", invalid="ignore"):
+        ssr = (left_squares - left_sum**2/left_n) + (right_squares - right_sum**2/right_n)
+
+    # a missing category leaves an empty side, it is not a split
+    ssr[sizes == 0] = inf
+
+    best = argmin(ssr)
+
+    return ssr[best], values[best], present
@@ -1,8 +1,10 @@
 from pandas import DataFrame
-from numpy import int64, unique
+from numpy import intp, unique, bincount, count_nonzero, mean, tile, asarray, array, ndarray, float64
 
-from ScratchML.consts import cls_x, cls_y, labelName, labelIndex
-from ScratchML.DecisionTrees._abstract import DecisionTree, DecisionNode
+from ScratchML.consts import cls_x, cls_y, labelName
+from ScratchML.DecisionTrees._abstract import DecisionTree, DecisionNode, TrainingData
+from ScratchML.DecisionTrees._splitter import gini_numeric_split, gini_categorical_split
+from ScratchML.DecisionTrees._histogram import gini_histogram_split, gini_histogram_category_split
 
 class ClassifierNode(DecisionNode):
     """
@@ -11,21 +13,24 @@ class ClassifierNode(DecisionNode):
     Args:
         DecisionNode : The parent class
     """
-    def __init__(self,data: DataFrame, left=None, right=None, depth:int=0):
+    def __init__(self,data: TrainingData, start:int=0, end:int=None, left=None, right=None, depth:int=0):
         """
         Classifier Node Constructor
         
         Args:
-            data (DataFrame): the node data.
+            data (TrainingData): the shared training data.
+            start (int, optional): the first position of the node rows in data.rows. Defaults to 0.
+            end (int, optional): the position after the last node row in data.rows. Defaults to all the rows.
             left (ClassifierNode, optional): the left child node. Defaults to None.
             right (ClassifierNode, optional): the right child node. Defaults to None.
             depth (int, optional): The depth of the node. Defaults to 0.
         """
         
-        super().__init__(data, left, right, depth)
+        super().__init__(data, start, end, left, right, depth)
         
         self.gini = 1 # uncalibrated gini value
         self.predictedClass = ""
+        self.majorityClass = "" # the prediction of the node, were it a leaf
     
     
     def giniScore(self):
@@ -36,12 +41,12 @@ class ClassifierNode(DecisionNode):
             float: the gini score
         """
         
-        totalSamples = len(self.data)
-        classA = self.count_class_num(cls_x)
-        pA = classA/totalSamples
+        totalSamples = self.samples
         if totalSamples==0:
             return 1 
-        return 2*pA(1-pA)
+        classA = self.count_class_num(cls_x)
+        pA = classA/totalSamples
+        return 2*pA*(1-pA)
     
     
     def count_class_num(self,className):
@@ -55,12 +60,49 @@ class ClassifierNode(DecisionNode):
             int: the number of occurrences of the class
         """
         
-        try:
-            return len(self.data[self.data[:,labelIndex] == className])
+        return int(count_nonzero(self.target() == self.train.encode(self.train.label, className)))
+    
+    
+    def class_weight(self,className):
+        """
+        Sum the weights of the samples of a certain class in the current node
+
+        Args:
+            className (str): the class name
+
+        Returns:
+            float: the total weight of the class, its number of samples if the samples are unweighted
+        """
+        
+        weight = self.weight()
+        if weight is None:
+            return self.count_class_num(className)
         
-        #if there are no samples from the requested class(a pure split)
-        except Exception:
-            return 0
+        return weight[self.target() == self.train.encode(self.train.label, className)].sum()
+    
+    
+    def total_weight(self):
+        """
+        Sum the weights of the samples of the current node
+
+        Returns:
+            float: the total weight, the number of samples if the samples are unweighted
+        """
+        
+        weight = self.weight()
+        
+        return self.samples if weight is None else weight.sum()
+    
+    
+    def positive(self):
+        """
+        Whether every sample of the current node is of class cls_y
+
+        Returns:
+            np.ndarray: the boolean mask of the cls_y samples
+        """
+        
+        return self.target() == self.train.encode(self.train.label, cls_y)
 
 
     # threshold is used for numeric feature         
@@ -76,19 +118,23 @@ class ClassifierNode(DecisionNode):
             float: the gini impurity factor
         """
         
+        column = self.column(feature_index)
+        positive = self.positive()
+        
         # If the feature index is categorial
         if threshold is None:
-            values = unique(self.data[:,feature_index])
-            r = self.data[self.data[:,feature_index] == values[0]]
-            l = self.data[self.data[:,feature_index] == values[1]]
+            values = unique(column)
+            r = column == values[0]
+            l = column == values[1]
             
         # Else, if the feature index is numerical
         else:
-            r = self.data[self.data[:,feature_index] >= threshold]
-            l = self.data[self.data[:,feature_index] < threshold]
+            l = column < threshold
+            r = ~l
             
-        lP = len(l[l[:,labelIndex] == cls_y])
-        rP = len(r[r[:,labelIndex] == cls_y])
+        l, r = positive[l], positive[r]
+        lP = count_nonzero(l)
+        rP = count_nonzero(r)
 
         # if there is a clean split (all samples in one child node)
         if len(r)==0 or len(l)==0:
@@ -112,71 +158,200 @@ class ClassifierNode(DecisionNode):
     
     def calc_gini_numeric_feature(self, feature_index: int):
         """
-        Calculate the gini impurity for numeric feature
+        Calculate the gini impurity for numeric feature.
+            The feature is sorted once and all the thresholds are scored together
+            (see gini_numeric_split), which takes O(n log n) per feature.
 
         Args:
             feature_index (int): the numeric feature index
 
         Returns:
-            float: the gini impurity factor
+            tuple: the best gini impurity factor and its threshold
         """
 
-        # Sort the values of the new dataframe, increasing by the values of the nomericFeature column
-        self.data[self.data[:, feature_index].argsort()]
+        return self._giniSplit(feature_index, False)[:2]
+    
+    
+    def calc_gini_categorical_feature(self, feature_index: int):
+        """
+        Calculate the gini impurity for categorical feature.
+            Every category is scored against the rest (see gini_categorical_split).
 
-        best_gini, best_threshold = 1, float('inf')
+        Args:
+            feature_index (int): the categorical feature index
 
-        # run on any adjacent values and find the best split axis
-        for i in range(0, len(self.data)-1) :
-            threshold = (self.data[i][feature_index]+self.data[i+1][feature_index])/2
-            gini = self.calc_gini_impurity(feature_index, threshold)
-            if gini < best_gini:
-                best_gini = gini
-                best_threshold = threshold
+        Returns:
+            tuple: the best gini impurity factor and the category sent to the left
+        """
+
+        return self._giniSplit(feature_index, True)[:2]
 
-        return best_gini, best_threshold
+
+    def _giniSplit(self, feature_index: int, categorical: bool):
+        """
+        Score a feature by the gini impurity on the exact values of the node samples
+
+        Args:
+            feature_index (int): the feature index
+            categorical (bool): whether the feature is categorical
+
+        Returns:
+            tuple: the best gini impurity factor, its threshold or the category sent to the left,
+                and the number of split candidates the kernel scored
+        """
+
+        x = self.column(feature_index)
+        y = self.positive().astype(int)
+
+        if categorical:
+            gini, category, candidates = gini_categorical_split(x, y, 2, self.weight(), self._categoryCount(feature_index))
+            value = None if category is None else self.train.decode(feature_index, category)
+        else:
+            gini, value, candidates = gini_numeric_split(x, y, 2, self.weight())
+
+        # nothing to split on (a single value or category)
+        if gini == float('inf'):
+            gini = 1
+
+        return gini, value, candidates
      
     
+    def _binned_target(self):
+        """
+        The class code of every sample, accumulated by the histograms
+
+        Returns:
+            np.ndarray: the class codes
+        """
+        
+        return (self.train.y == self.train.encode(self.train.label, cls_y)).astype(intp)
+    
+    
+    def _histogram(self, rows):
+        """
+        Count the samples of every class in every bin, for every feature,
+            or sum their weights if the samples are weighted
+
+        Args:
+            rows (np.ndarray): the row indices into the binned training data
+
+        Returns:
+            np.ndarray: the class counts (or weights), shaped (features, bins, 2)
+        """
+        
+        bins = self.train.bins
+        index = bins.flat_index(rows)*2 + bins.target[rows]
+        weights = None if self.train.weights is None else tile(self.train.weights[rows], len(bins.offsets))
+        
+        return bincount(index.ravel(), weights=weights, minlength=len(bins.offsets)*bins.n_bins*2) \
+            .reshape(len(bins.offsets), bins.n_bins, 2)
+    
+    
+    def _scoreFeature(self, i: int):
+        """
+        Find the best split of a single feature.
+            The node is only read, so the features may be scored concurrently
+
+        Args:
+            i (int): the feature index
+
+        Returns:
+            tuple: the gini impurity, the split value (exact training),
+                the split bin (histogram-binned training) and the number of split candidates
+        """
+        
+        # If the split is searched on the histogram bins
+        if self.train.bins is not None:
+            if self.train.schema[i]:
+                gini, featureBin = gini_histogram_category_split(self.hist[i], len(self.train.bins.categories[i]))
+            else:
+                gini, featureBin = gini_histogram_split(self.hist[i])
+            return gini, None, featureBin, self._binCount(i)
+        
+        gini, value, candidates = self._giniSplit(i, self.train.schema[i])
+        return gini, value, 0, candidates
+    
+    
     def _bestSplit(self):
         """
         Perform a node calibration, 
             and find the best split axis for the current node
         """
         
+        features = self._candidates([i for i in range(len(self.data_labels)) if i!=0 and self.data_labels[i]!=labelName])
+        
         min_gini = 1
         
-        for i in range (len(self.data_labels)):
-        
-            # if self.data_labels[i]!=labelName :
-            if i!=0 and self.data_labels[i]!=labelName :
-                
-                #in case that the feature is categorial
-                if len(unique(self.data[:,i]))==2 : 
-                    self.featureVal = 0
-                    gini = self.calc_gini_impurity (i, None)
-                    if gini < min_gini:
-                        min_gini = gini
-                        self.featureName = self.data_labels[i]
-                        self.featureIndex = i
-                        self.featureVal = 1
-                        self.gini = gini
-                        
-                #in case that the feature is numeric        
-                else :
-                    numricGini, threshold = self.calc_gini_numeric_feature(i)
-                    if numricGini < min_gini:
-                        min_gini = numricGini
-                        self.featureName = self.data_labels[i]
-                        self.featureIndex = i
-                        self.featureVal = threshold
-                        self.gini = numricGini
+        # reduced in feature order, so the first best feature wins as in a serial scan
+        for i, (gini, value, featureBin, _) in zip(features, self._scoreFeatures(features)):
+            if gini < min_gini:
+                min_gini = gini
+                self.featureName = self.data_labels[i]
+                self.featureIndex = i
+                self.featureBin = featureBin
+                self.featureVal = value if self.train.bins is None else self._binValue(i, featureBin)
+                self.gini = gini
         
     
+    def _statistics(self):
+        """
+        The number of samples of either class, or the sum of their weights if the samples are weighted.
+            The labels are compared decoded, a batch may miss a class.
+
+        Returns:
+            np.ndarray: the cls_x and the cls_y statistics
+        """
+        
+        categories = self.train.categories[self.train.label]
+        labels = self.target() if categories is None else categories[self.target()]
+        weight = self.weight()
+        
+        return array([(labels == className).sum() if weight is None else weight[labels == className].sum()
+                      for className in (cls_x, cls_y)], dtype=float64)
+    
+    
+    def _impurity(self, stats: ndarray):
+        """
+        The total gini impurity of samples of the given statistics (the gini score times their number)
+
+        Args:
+            stats (np.ndarray): the cls_x and the cls_y statistics
+
+        Returns:
+            float: the total gini impurity
+        """
+        
+        total = stats.sum()
+        
+        return 2*stats[0]*stats[1]/total if total > 0 else 0.0
+    
+    
+    def _updateValue(self):
+        """
+        Set the majority class of the node from its statistics, and the prediction of a leaf
+        """
+        
+        self.majorityClass = cls_x if self.stats[0] > self.stats[1] else cls_y
+        if self.left is None and self.right is None:
+            self.predictedClass = self.majorityClass
+    
+    
+    def _splitGain(self):
+        """
+        The total gini impurity of the node less the one of its best split
+
+        Returns:
+            float: the impurity reduction
+        """
+        
+        return self._impurity(self._statistics()) - self.gini*self.total_weight()
+    
+    
     def make_leaf(self):
         """
         Make a leaf out of current Node
         """
-        pA, pB = self.count_class_num(cls_x), self.count_class_num(cls_y)
+        pA, pB = self.class_weight(cls_x), self.class_weight(cls_y)
         self.predictedClass = cls_x if pA > pB else cls_y
         
     
@@ -196,17 +371,36 @@ class DTClassifier(DecisionTree):
     Args:
         DecisionTree: the parent class
     """
-    def __init__(self, data, maxDepth, minSample):
+    def __init__(self, data, maxDepth, minSample, maxBins=None, categorical=None, n_jobs=None, weights=None,
+                 maxLeafNodes=None, minGain=0.0):
         """
         Classifier Constructor
 
         Args:
-            data (pd.DataFrame): the data of the classifier
+            data (pd.DataFrame | TrainingData): the data of the classifier,
+                training data may be shared with other trees fitted in turn
             maxDepth (int): the max depth of the classifier
             minSample (int): the minimum samples in a node in order to split
+            maxBins (int, optional): the number of histogram bins per feature,
+                None to train on the exact values. Defaults to None.
+            categorical (list, optional): the names of the categorical features,
+                None to infer them from the training data. Defaults to None.
+            n_jobs (int, optional): the number of threads scoring the node features,
+                -1 for one per core. Defaults to None (serial).
+            weights (np.ndarray, optional): the weight of every training sample in the gini impurity
+                and the majority class, None to keep the weights of the data. Defaults to None.
+            maxLeafNodes (int, optional): grow the classifier best-first, up to maxLeafNodes leaves.
+                Defaults to None (depth-first).
+            minGain (float, optional): grow the classifier best-first, splitting only the nodes whose
+                gini reduction per sample is above minGain. Defaults to 0.0.
         """
         
-        super().__init__(maxDepth, minSample)
+        super().__init__(maxDepth, minSample, maxBins, categorical, n_jobs, maxLeafNodes, minGain)
+        
+        if isinstance(data, DataFrame):
+            data = TrainingData(data, labelName, weights)
+        elif weights is not None:
+            data.weights = asarray(weights, dtype=float64)
         
         self.root = ClassifierNode(data)
             
@@ -219,11 +413,11 @@ class DTClassifier(DecisionTree):
             node (ClassifierNode): the node to split
         """
         
-        dfA, dfB = super()._split(node)
+        (startA, endA), (startB, endB) = super()._split(node)
 
-        if len(dfA) > 0 and len(dfB) > 0:
-            node.right = ClassifierNode(data=dfA,depth=node.depth+1)
-            node.left = ClassifierNode(data=dfB,depth=node.depth+1)
+        if endA > startA and endB > startB:
+            node.right = ClassifierNode(node.train, startA, endA, depth=node.depth+1)
+            node.left = ClassifierNode(node.train, startB, endB, depth=node.depth+1)
         else:
             node.make_leaf()
             
@@ -236,21 +430,58 @@ class DTClassifier(DecisionTree):
             node (ClassifierNode): the Classifier node
         """
         
+        if node is not None:
+            classA = node.class_weight(cls_x)
+            classB = node.total_weight()-classA
+            node.majorityClass = cls_x if classA > classB else cls_y
+        
         if self._can_split(node) and node.gini != 0:
             super()._fit(node)
 
         else:
             if node is not None:
-                classA = node.count_class_num(cls_x)
-                if not isinstance(classA, int) and not isinstance(classA, int64):
-                    classA = len(classA)
-                classB = len(node.data)-classA
-                if classA > classB:
-                    node.predictedClass = cls_x
-                else:
-                    node.predictedClass = cls_y
-        if node is not None:
-            self.graph.node(node.id, node.__str__())
+                self._made_leaf(node)
+    
+    
+    def _made_leaf(self, node: ClassifierNode):
+        """
+        Make a leaf predicting the majority class of a node
+
+        Args:
+            node (ClassifierNode): the leaf
+        """
+        
+        node.predictedClass = node.majorityClass
+        super()._made_leaf(node)
+    
+    
+    def _leaf_value(self, node: ClassifierNode):
+        """
+        The prediction of a node, were it a leaf
+
+        Args:
+            node (ClassifierNode): the node
+
+        Returns:
+            str: the predicted class
+        """
+        
+        return node.majorityClass
+    
+    
+    def _score(self, data, predicted):
+        """
+        Score predictions against the true classes
+
+        Args:
+            data (pd.DataFrame): the samples, holding the true classes
+            predicted (np.ndarray): the predicted classes
+
+        Returns:
+            dict: the accuracy
+        """
+        
+        return {"accuracy": mean(predicted == data[labelName].values)}
     
     
     def _predict(self, node: ClassifierNode ,samp):
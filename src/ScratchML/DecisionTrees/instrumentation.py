@@ -0,0 +1,196 @@
+from threading import Lock
+from collections import defaultdict
+from pandas import DataFrame
+
+
+class TreeEvents:
+    """
+    Tree Fitting Events Definition.
+        The events fired while a tree is fitted (see DecisionTree.fit), one method per event.
+        Every method does nothing here, a subclass overrides the events it listens to.
+        The split search events may be fired from the feature threads (see DecisionTree.n_jobs).
+    """
+
+    def node_created(self, node):
+        """
+        A node was created, the root or a child of a split node
+
+        Args:
+            node (DecisionNode): the new node
+        """
+        pass
+
+    def split_evaluated(self, node, feature: int, score: float, thresholds: int, seconds: float):
+        """
+        A feature of a node was scored by the split search
+
+        Args:
+            node (DecisionNode): the node
+            feature (int): the feature index
+            score (float): the impurity of the best split of the feature
+            thresholds (int): the number of split candidates scored, the categories of a categorical
+                feature, the distinct values (or bins) of a numeric one but one
+            seconds (float): the time the feature took to score
+        """
+        pass
+
+    def split_made(self, node, search_seconds: float, partition_seconds: float, rows_copied: int, bytes_copied: int):
+        """
+        A node was split: its best split was searched and its rows were partitioned
+
+        Args:
+            node (DecisionNode): the node
+            search_seconds (float): the time of the split search
+            partition_seconds (float): the time of the row partition
+            rows_copied (int): the number of row indices the partition copied
+            bytes_copied (int): the bytes the partition allocated
+        """
+        pass
+
+    def leaf_created(self, node):
+        """
+        A node was made a leaf
+
+        Args:
+            node (DecisionNode): the leaf
+        """
+        pass
+
+    def spawn(self):
+        """
+        The events of a forked subtree worker (see DecisionTree._fitForked),
+            merged back once the subtree is grown
+
+        Returns:
+            TreeEvents: the worker events
+        """
+
+        return self
+
+    def merge(self, other):
+        """
+        Merge the events of a forked subtree worker
+
+        Args:
+            other (TreeEvents): the worker events (see spawn)
+        """
+        pass
+
+
+class FitCollector(TreeEvents):
+    """
+    Fit Statistics Collector Definition.
+        Counts the nodes, leaves and splits of every depth, the time spent in split search
+        and row partitioning, the thresholds evaluated and the row bytes copied,
+        and the time and thresholds of every feature.
+    """
+
+    # the statistics kept for every depth, and for every feature
+    DEPTH = ("nodes", "leaves", "splits", "search_seconds", "partition_seconds",
+             "features_scored", "thresholds", "rows_copied", "bytes_copied")
+    FEATURE = ("scored", "thresholds", "seconds")
+
+    def __init__(self):
+        """
+        Fit Statistics Collector Constructor
+        """
+
+        self.depths = defaultdict(lambda: dict.fromkeys(FitCollector.DEPTH, 0))
+        self.features = defaultdict(lambda: dict.fromkeys(FitCollector.FEATURE, 0))
+
+        # the split search events come from the feature threads
+        self._lock = Lock()
+
+    def __getstate__(self):
+        """
+        The statistics of the collector, sent back by a forked subtree worker
+
+        Returns:
+            dict: the statistics of every depth and every feature
+        """
+
+        return {"depths": dict(self.depths), "features": dict(self.features)}
+
+    def __setstate__(self, state: dict):
+        """
+        Restore the statistics of a collector sent back by a forked subtree worker
+
+        Args:
+            state (dict): the statistics of every depth and every feature
+        """
+
+        self.__init__()
+        self.depths.update(state["depths"])
+        self.features.update(state["features"])
+
+    def node_created(self, node):
+        with self._lock:
+            self.depths[node.depth]["nodes"] += 1
+
+    def split_evaluated(self, node, feature: int, score: float, thresholds: int, seconds: float):
+        name = node.data_labels[feature]
+
+        with self._lock:
+            depth = self.depths[node.depth]
+            depth["features_scored"] += 1
+            depth["thresholds"] += thresholds
+
+            stats = self.features[name]
+            stats["scored"] += 1
+            stats["thresholds"] += thresholds
+            stats["seconds"] += seconds
+
+    def split_made(self, node, search_seconds: float, partition_seconds: float, rows_copied: int, bytes_copied: int):
+        with self._lock:
+            depth = self.depths[node.depth]
+            depth["splits"] += 1
+            depth["search_seconds"] += search_seconds
+            depth["partition_seconds"] += partition_seconds
+            depth["rows_copied"] += rows_copied
+            depth["bytes_copied"] += bytes_copied
+
+    def leaf_created(self, node):
+        with self._lock:
+            self.depths[node.depth]["leaves"] += 1
+
+    def spawn(self):
+        return FitCollector()
+
+    def merge(self, other):
+        with self._lock:
+            for table, other_table in ((self.depths, other.depths), (self.features, other.features)):
+                for k, stats in other_table.items():
+                    for name, value in stats.items():
+                        table[k][name] += value
+
+    def by_depth(self):
+        """
+        The statistics of every depth
+
+        Returns:
+            pd.DataFrame: a row per depth
+        """
+
+        return DataFrame.from_dict(dict(self.depths), orient="index", columns=list(FitCollector.DEPTH)) \
+            .rename_axis("depth").sort_index()
+
+    def by_feature(self):
+        """
+        The statistics of every feature, the slowest first
+
+        Returns:
+            pd.DataFrame: a row per feature
+        """
+
+        return DataFrame.from_dict(dict(self.features), orient="index", columns=list(FitCollector.FEATURE)) \
+            .rename_axis("feature").sort_values("seconds", ascending=False)
+
+    def summary(self):
+        """
+        The statistics of the whole fit
+
+        Returns:
+            dict: every depth statistic summed over the depths
+        """
+
+        return {name: sum(stats[name] for stats in self.depths.values()) for name in FitCollector.DEPTH}
@@ -1,9 +1,11 @@
 
 from pandas import DataFrame
-from numpy import mean, sum, square, subtract, unique, ndarray
+from numpy import mean, sum, ndarray, bincount, tile, stack, array, float64
 
-from ScratchML.consts import labelNumericIndex, labelNumericName, labels_rgr
-from ScratchML.DecisionTrees._abstract import DecisionNode, DecisionTree
+from ScratchML.consts import labelNumericName, labels_rgr
+from ScratchML.DecisionTrees._abstract import DecisionNode, DecisionTree, TrainingData
+from ScratchML.DecisionTrees._splitter import ssr_numeric_split, ssr_categorical_split
+from ScratchML.DecisionTrees._histogram import ssr_histogram_split, ssr_histogram_category_split
 
 
 class RegressionNode(DecisionNode):
@@ -13,22 +15,24 @@ class RegressionNode(DecisionNode):
     Args:
         DecisionNode : The parent class
     """
-    def __init__(self,data: DataFrame, left=None, right=None, depth:int=0):
+    def __init__(self,data: TrainingData, start:int=0, end:int=None, left=None, right=None, depth:int=0):
         """
         Regression Node Constructor
         
         Args:
-            data (DataFrame): the node data.
+            data (TrainingData): the shared training data.
+            start (int, optional): the first position of the node rows in data.rows. Defaults to 0.
+            end (int, optional): the position after the last node row in data.rows. Defaults to all the rows.
             left (ClassifierNode, optional): the left child node. Defaults to None.
             right (ClassifierNode, optional): the right child node. Defaults to None.
             depth (int, optional): The depth of the node. Defaults to 0.
         """
         
-        super().__init__(data, left, right, depth)
+        super().__init__(data, start, end, left, right, depth)
         
         self.ssr = 0 # Uncalibrated ssr value
         
-        self.predictedVal = mean(self.data[:, labelNumericIndex])
+        self.predictedVal = mean(self.target())
 
 
     # This function choose the best avg to split by choosing avg that gives the lowest ssr
@@ -39,73 +43,151 @@ class RegressionNode(DecisionNode):
             feature_index (int): the feature index
 
         Returns:
-            float: the calculated ssr value
+            tuple: the calculated ssr value, and the threshold of a numeric feature
+                or the category sent to the left of a categorical one
         """
 
+        return self._ssrSplit(feature_index)[:2]
+
+    def _ssrSplit(self, feature_index: int):
+        """
+        Score a feature by the ssr on the exact values of the node samples
+
+        Args:
+            feature_index (int): the feature index
+
+        Returns:
+            tuple: the calculated ssr value, the threshold or the category sent to the left,
+                and the number of split candidates the kernel scored
+        """
+
+        column = self.column(feature_index)
+        y = self.target()
 
         # If the feature is categorial
-        if len(unique(self.data[:,feature_index]))<=2:
-            
-            # if only one category, don't split
-            if len(unique(self.data[:,feature_index]))<2:
-                min_ssr = float('inf')
-                best_avarage = float('inf')
-            
-            else:
-                values = unique(self.data[:,feature_index]) # return array with thw two optional values
-                class_right = self.data[self.data[:,feature_index] == values[0]]
-                class_left = self.data[self.data[:,feature_index] == values[1]]
-                right_ssr = self.calc_ssr(class_right)
-                left_ssr = self.calc_ssr(class_left)
-                feature_ssr = right_ssr + left_ssr
-                min_ssr = feature_ssr
-
-                best_avarage = 0
+        if self.train.schema[feature_index]:
+            min_ssr, category, candidates = ssr_categorical_split(column, y, self._categoryCount(feature_index))
+            best_avarage = None if category is None else self.train.decode(feature_index, category)
         else:
-            
-            # Sort the values of the new dataframe by the feature index column
-            self.data[self.data[:,feature_index].argsort()]
+            min_ssr, best_avarage, candidates = ssr_numeric_split(column, y)
 
-            min_ssr = float('inf')
-            best_avarage = float('inf')
+        return min_ssr, best_avarage, candidates
 
-            for i in range(0, len(self.data)-1) :
-                
-                avarage = (self.data[i][feature_index]+self.data[i+1][feature_index])/2
-                class_right = self.data[self.data[:,feature_index] >= avarage]
-                class_left = self.data[self.data[:,feature_index] < avarage]
-                right_ssr = self.calc_ssr(class_right)
-                left_ssr = self.calc_ssr(class_left)
-                feature_ssr = right_ssr + left_ssr
-                
-                if feature_ssr < min_ssr:
-                    min_ssr = feature_ssr
-                    best_avarage = avarage
+    def calc_ssr(self, label_values: ndarray):
+        """
+        Calculate the ssr of the given label values
 
-        return min_ssr, best_avarage
+        Args:
+            label_values (np.ndarray): the label values
 
-    def calc_ssr(self, data: ndarray):
+        Returns:
+            float: the ssr value
         """
-        Calculate the ssr of the current data
+
+        if len(label_values) == 0:
+            return 0
+
+        return sum((label_values - mean(label_values))**2)
+
+    def _binned_target(self):
+        """
+        The centered label of every sample, accumulated by the histograms
+
+        Returns:
+            np.ndarray: the centered label values
+        """
+
+        return self.train.y - mean(self.train.y)
+
+    def _histogram(self, rows):
+        """
+        Sum the count, label and squared label of the samples in every bin, for every feature
+
+        Args:
+            rows (np.ndarray): the row indices into the binned training data
+
+        Returns:
+            np.ndarray: the bin statistics, shaped (features, bins, 3)
+        """
+
+        bins = self.train.bins
+        index = bins.flat_index(rows).ravel()
+        target = tile(bins.target[rows], len(bins.offsets))
+        size = len(bins.offsets)*bins.n_bins
+
+        return stack([
+            bincount(index, minlength=size),
+            bincount(index, weights=target, minlength=size),
+            bincount(index, weights=target**2, minlength=size),
+        ], axis=-1).reshape(len(bins.offsets), bins.n_bins, 3)
+
+    def _statistics(self):
+        """
+        The number of samples, and the sum and the sum of squares of their labels
+
+        Returns:
+            np.ndarray: the statistics
+        """
+
+        y = self.target()
+
+        return array([len(y), y.sum(), (y**2).sum()], dtype=float64)
+
+    def _impurity(self, stats: ndarray):
+        """
+        The ssr of samples of the given statistics
 
         Args:
-            data (np.ndarray): the data
+            stats (np.ndarray): the number of samples, the sum and the sum of squares of their labels
 
         Returns:
             float: the ssr value
         """
 
-        label_values = data[ : , labelNumericIndex]
+        n, total, squares = stats
 
-        avg = []
-        
-        [
-            avg.append(mean(label_values) if len(label_values) > 0 else 0)
-        ]
-        
-        ssr = sum((label_values - avg)**2)
-        
-        return ssr
+        return max(squares - total**2/n, 0.0) if n > 0 else 0.0
+
+    def _updateValue(self):
+        """
+        Predict the mean label of the node samples, from its statistics
+        """
+
+        self.predictedVal = self.stats[1]/self.stats[0]
+
+    def _splitGain(self):
+        """
+        The ssr of the node less the one of its best split
+
+        Returns:
+            float: the ssr reduction
+        """
+
+        return self._impurity(self._statistics()) - self.ssr
+
+    def _scoreFeature(self, i: int):
+        """
+        Find the best split of a single feature.
+            The node is only read, so the features may be scored concurrently
+
+        Args:
+            i (int): the feature index
+
+        Returns:
+            tuple: the ssr value, the split value (exact training),
+                the split bin (histogram-binned training) and the number of split candidates
+        """
+
+        # If the split is searched on the histogram bins
+        if self.train.bins is not None:
+            if self.train.schema[i]:
+                ssr_score, featureBin = ssr_histogram_category_split(self.hist[i], len(self.train.bins.categories[i]))
+            else:
+                ssr_score, featureBin = ssr_histogram_split(self.hist[i])
+            return ssr_score, None, featureBin, self._binCount(i)
+
+        ssr_score, best_avg, candidates = self._ssrSplit(i)
+        return ssr_score, best_avg, 0, candidates
 
     def _bestSplit(self):
         """
@@ -113,20 +195,19 @@ class RegressionNode(DecisionNode):
             and find the best split axis for the current node
         """
 
-        min_ssr = float('inf')
-
-        for i in range (len(self.data_labels)):
+        features = self._candidates([i for i in range(len(self.data_labels)) if i!=0 and self.data_labels[i]!=labelNumericName])
 
-            if i!=0 and self.data_labels[i]!=labelNumericName :
-
-                ssr_score, best_avg = self.calc_ssr_to_feature(i)
+        min_ssr = float('inf')
 
-                if ssr_score < min_ssr:
-                    min_ssr = ssr_score
-                    self.ssr = ssr_score
-                    self.featureName = self.data_labels[i]
-                    self.featureIndex = i
-                    self.featureVal = best_avg
+        # reduced in feature order, so the first best feature wins as in a serial scan
+        for i, (ssr_score, value, featureBin, _) in zip(features, self._scoreFeatures(features)):
+            if ssr_score < min_ssr:
+                min_ssr = ssr_score
+                self.ssr = ssr_score
+                self.featureName = self.data_labels[i]
+                self.featureIndex = i
+                self.featureBin = featureBin
+                self.featureVal = value if self.train.bins is None else self._binValue(i, featureBin)
     
     def __str__(self):
         return f"Predicting: {round(self.predictedVal,3)}" if self.left is None and self.right is None else f"Spliting on\n{self.featureName}={self.featureVal}"
@@ -139,17 +220,32 @@ class DTRegressor(DecisionTree):
         DecisionTree: the parent class
     """
     
-    def __init__(self, data: DataFrame, maxDepth, minSample):
+    def __init__(self, data, maxDepth, minSample, maxBins=None, categorical=None, n_jobs=None,
+                 maxLeafNodes=None, minGain=0.0):
         """
         Regressor Constructor
 
         Args:
-            data (pd.DataFrame): the data of the regressor
+            data (pd.DataFrame | TrainingData): the data of the regressor,
+                training data may be shared with other trees fitted in turn
             maxDepth (int): the max depth of the regressor
             minSample (int): the minimum samples in a node in order to split
+            maxBins (int, optional): the number of histogram bins per feature,
+                None to train on the exact values. Defaults to None.
+            categorical (list, optional): the names of the categorical features,
+                None to infer them from the training data. Defaults to None.
+            n_jobs (int, optional): the number of threads scoring the node features,
+                -1 for one per core. Defaults to None (serial).
+            maxLeafNodes (int, optional): grow the regressor best-first, up to maxLeafNodes leaves.
+                Defaults to None (depth-first).
+            minGain (float, optional): grow the regressor best-first, splitting only the nodes whose
+                mse reduction per sample is above minGain. Defaults to 0.0.
         """
         
-        super().__init__(maxDepth, minSample)
+        super().__init__(maxDepth, minSample, maxBins, categorical, n_jobs, maxLeafNodes, minGain)
+        
+        if isinstance(data, DataFrame):
+            data = TrainingData(data, labelNumericName)
         
         self.root = RegressionNode(data)
 
@@ -162,11 +258,11 @@ class DTRegressor(DecisionTree):
             node (ReggressionNode): the node to split
         """
 
-        dfA, dfB = super()._split(node)
-        if len(dfA) > 0 and len(dfB) > 0: # in case we split the data correctly
+        (startA, endA), (startB, endB) = super()._split(node)
+        if endA > startA and endB > startB: # in case we split the data correctly
             
-            node.right = RegressionNode(dfA,None,None, node.depth+1)
-            node.left = RegressionNode(dfB, None,None, node.depth+1)
+            node.right = RegressionNode(node.train, startA, endA, None, None, node.depth+1)
+            node.left = RegressionNode(node.train, startB, endB, None, None, node.depth+1)
 
     
     def _fit(self, node: RegressionNode):
@@ -179,8 +275,37 @@ class DTRegressor(DecisionTree):
         
         if self._can_split(node):
             super()._fit(node)
-        if node is not None:
-            self.graph.node(node.id, node.__str__())
+        elif node is not None:
+            self._made_leaf(node)
+
+
+    def _leaf_value(self, node: RegressionNode):
+        """
+        The prediction of a node, were it a leaf
+
+        Args:
+            node (ReggressionNode): the node
+
+        Returns:
+            float: the predicted value
+        """
+
+        return node.predictedVal
+
+
+    def _score(self, data: DataFrame, predicted):
+        """
+        Score predictions against the true values
+
+        Args:
+            data (pd.DataFrame): the samples, holding the true values
+            predicted (np.ndarray): the predicted values
+
+        Returns:
+            dict: the mean squared error
+        """
+
+        return {"mse": mean((predicted - data[labelNumericName].values.astype(float))**2)}
 
 
     def _predict(self, node: RegressionNode ,samp):
@@ -0,0 +1,72 @@
+from itertools import product
+from time import perf_counter
+from pandas import DataFrame
+from numpy import arange, argmax, count_nonzero
+
+
+def sweep(model, data: DataFrame, validation: DataFrame, maxDepths: list, minSamples: list, **kwargs):
+    """
+    Score every (maxDepth, minSample) pair of a grid on the validation set,
+        out of a single fit. The largest tree of the grid is grown once, every grid
+        point is derived by truncating it (see FlatTree.truncate), and the validation
+        samples are routed once down the largest tree for all the grid points.
+
+    Args:
+        model (type): DTClassifier or DTRegressor
+        data (pd.DataFrame): the training data
+        validation (pd.DataFrame): the validation data, holding the true labels
+        maxDepths (list): the max depths of the grid
+        minSamples (list): the minimum samples in a node in order to split, of the grid
+        **kwargs: the other arguments of the model constructor (maxBins, categorical, n_jobs).
+            A best-first tree (maxLeafNodes, minGain) truncated at a depth is not the tree
+            fitted to that depth, so neither is accepted.
+
+    Returns:
+        pd.DataFrame: a row per grid point, with the number of nodes and leaves of the tree,
+            its score (see DecisionTree._score), the time it took to derive it and to score it. The shared fit and routing times are kept in the
+            "fit_time" and "route_time" attrs of the table.
+    """
+    
+    if kwargs.get("maxLeafNodes") is not None or kwargs.get("minGain", 0) > 0:
+        raise ValueError("a best-first tree (maxLeafNodes, minGain) can't be swept by truncation, "
+                         "fit every grid point instead")
+    
+    start = perf_counter()
+    tree = model(data, max(maxDepths), min(minSamples), **kwargs)
+    tree.fit()
+    fit_time = perf_counter() - start
+    
+    start = perf_counter()
+    path = tree.flat.path(tree._columns(validation))
+    route_time = perf_counter() - start
+    
+    samples = arange(len(path))
+    results = []
+    
+    for maxDepth, minSample in product(maxDepths, minSamples):
+        start = perf_counter()
+        flat = tree.flat.truncate(maxDepth, minSample)
+        derive_time = perf_counter() - start
+        
+        # every sample stops at the first node of its path the truncated tree doesn't split
+        start = perf_counter()
+        predicted = flat.value[path[samples, argmax(flat.left[path] < 0, axis=1)]]
+        score = tree._score(validation, predicted)
+        predict_time = perf_counter() - start
+        
+        nodes = flat.reachable()
+        results.append({
+            "maxDepth": maxDepth,
+            "minSample": minSample,
+            "nodes": len(nodes),
+            "leaves": count_nonzero(flat.left[nodes] < 0),
+            **score,
+            "fit_time": derive_time,
+            "predict_time": predict_time,
+        })
+    
+    results = DataFrame(results)
+    results.attrs["fit_time"] = fit_time
+    results.attrs["route_time"] = route_time
+    
+    return results
@@ -0,0 +1,7 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import ScratchML.Ensembles.adaboost as adaboost
+import ScratchML.Ensembles.gradient_boosting as gradient_boosting
+import ScratchML.Ensembles.forest as forest
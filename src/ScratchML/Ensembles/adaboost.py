@@ -0,0 +1,158 @@
+from pandas import DataFrame, Series
+from numpy import full, where, exp, log
+
+from ScratchML._model_types import PredictionModel
+from ScratchML.consts import cls_x, cls_y, labelName
+from ScratchML.DecisionTrees._abstract import TrainingData
+from ScratchML.DecisionTrees._flat import StackedTrees
+from ScratchML.DecisionTrees.classifier import DTClassifier
+
+
+class AdaBoostClassifier(PredictionModel):
+    """
+    Adaptive Boost Classifier Definition.
+        Every round fits a shallow DTClassifier on the same training data,
+        with the sample weights counted in its gini impurity instead of resampling the data,
+        and the final prediction is the weighted vote of the compiled trees.
+
+    Args:
+        PredictionModel: the parent class
+    """
+    def __init__(self, data: DataFrame, n_estimators: int=50, learning_rate: float=1.0,
+                 maxDepth: int=1, minSample: int=2, maxBins: int=None, categorical: list=None):
+        """
+        Adaptive Boost Constructor
+
+        Args:
+            data (pd.DataFrame): the training data
+            n_estimators (int, optional): the maximal number of boosting rounds. Defaults to 50.
+            learning_rate (float, optional): the shrinkage of the vote of every tree. Defaults to 1.0.
+            maxDepth (int, optional): the max depth of every tree, 1 for stumps. Defaults to 1.
+            minSample (int, optional): the minimum samples in a node in order to split. Defaults to 2.
+            maxBins (int, optional): the number of histogram bins per feature,
+                None to train on the exact values. Defaults to None.
+            categorical (list, optional): the names of the categorical features,
+                None to infer them from the training data. Defaults to None.
+        """
+        
+        if n_estimators < 1:
+            raise ValueError(f"n_estimators must be a positive number, got {n_estimators}")
+        if learning_rate <= 0:
+            raise ValueError(f"learning_rate must be positive, got {learning_rate}")
+        
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.maxDepth = maxDepth
+        self.minSample = minSample
+        self.maxBins = maxBins
+        self.categorical = categorical
+        
+        # encoded once, and shared by the trees of every round
+        self.train = TrainingData(data, labelName)
+        
+        # the fitted trees and the weight of their vote
+        self.stumps = []
+        self.alphas = []
+        
+        # the stumps stacked for prediction, each voting +alpha for cls_y and -alpha for cls_x
+        self.stacked : StackedTrees = None
+    
+    
+    def fit(self):
+        """
+        Fit the boosting rounds.
+            Every round weighs the samples the previous trees misclassified up,
+            it stops early once a tree is no better than chance, or is perfect,
+            in which case that tree is kept alone.
+            The training data is released once the rounds are done.
+        """
+        
+        if self.train is None:
+            raise RuntimeError("the model is already fitted, its training data was released")
+        
+        train = self.train
+        columns = train.decoded()
+        positive = train.y == train.encode(train.label, cls_y)
+        
+        weights = full(len(train.rows), 1/len(train.rows))
+        
+        for _ in range(self.n_estimators):
+            stump = DTClassifier(train, self.maxDepth, self.minSample, self.maxBins, self.categorical,
+                                 weights=weights)
+            stump.fit()
+            
+            # the training samples are routed once down the compiled tree
+            miss = (stump.flat.predict(columns) == cls_y) != positive
+            error = weights[miss].sum()
+            
+            if error >= 0.5:
+                break
+            
+            # a perfect tree settles the vote alone, the earlier trees could outvote it
+            if error <= 0:
+                self.stumps, self.alphas = [stump], [1.0]
+                break
+            
+            alpha = self.learning_rate * 0.5 * log((1 - error)/error)
+            self.stumps.append(stump)
+            self.alphas.append(alpha)
+            
+            weights = weights * exp(where(miss, alpha, -alpha))
+            weights /= weights.sum()
+        
+        self.train = None
+        
+        if not self.stumps:
+            raise RuntimeError("no tree did better than chance on the training data")
+        
+        self.stacked = StackedTrees([stump.flat for stump in self.stumps],
+                                    [where(stump.flat.value == cls_y, 1.0, -1.0) for stump in self.stumps],
+                                    self.alphas)
+    
+    
+    def decision_function(self, X):
+        """
+        The weighted vote of the trees on every sample
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            np.ndarray: the vote, positive for cls_y and negative for cls_x
+        """
+        
+        if self.stacked is None:
+            raise RuntimeError("the model must be fitted before predicting")
+        
+        # all the stumps are routed at once, they share the training columns
+        return self.stacked.predict(self.stumps[0]._columns(X))
+    
+    
+    def predict_batch(self, X):
+        """
+        Predict every row of X at once
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            np.ndarray: the predicted classes
+        """
+        
+        return where(self.decision_function(X) > 0, cls_y, cls_x).astype(object)
+    
+    
+    def predict(self, samp):
+        """
+        Predict the class of a single sample
+
+        Args:
+            samp (pd.Series | list): the sample
+
+        Returns:
+            str: the predicted class
+        """
+        
+        return self.predict_batch(DataFrame([samp]) if isinstance(samp, Series) else [samp])[0]
@@ -0,0 +1,466 @@
+from os import cpu_count
+from multiprocessing import get_context, get_all_start_methods
+from pandas import DataFrame, Series
+from numpy import zeros, full, sort, arange, bincount, flatnonzero, sqrt, where, mean
+from numpy.random import SeedSequence, default_rng
+
+from ScratchML._model_types import PredictionModel
+from ScratchML.consts import cls_x, cls_y, labelName, labelNumericName
+from ScratchML.DecisionTrees._abstract import TrainingData
+from ScratchML.DecisionTrees._histogram import FeatureBins
+from ScratchML.DecisionTrees._flat import FlatTree, StackedTrees
+from ScratchML.DecisionTrees.classifier import DTClassifier
+from ScratchML.DecisionTrees.regressor import DTRegressor
+
+# the forest and its decoded training columns, inherited by the forked tree workers (see RandomForest.fit)
+_forked = None
+
+
+def _fit_forked(k: int):
+    """
+    Fit a single tree of the forest in a forked worker
+
+    Args:
+        k (int): the index of the tree in the forest
+
+    Returns:
+        tuple: the fitted tree, its out-of-bag rows and their predictions
+    """
+
+    forest, columns = _forked
+    return forest._fitTree(k, columns)
+
+
+class RandomForest(PredictionModel):
+    """
+    Abstract Random Forest Definition.
+        Every tree is grown on a bootstrap sample of the rows, held as an index array
+        into the shared training data, and every node scores a random subset of the features.
+        The trees are grown on forked processes, which share the encoded training data for free.
+
+    Args:
+        PredictionModel: the parent class
+    """
+    def __init__(self, data: TrainingData, maxDepth: int, minSample: int, n_estimators: int=100,
+                 maxFeatures=None, bootstrap: bool=True, maxBins: int=None, categorical: list=None,
+                 n_jobs: int=None, random_state: int=None):
+        """
+        Random Forest Constructor
+
+        Args:
+            data (TrainingData): the encoded training data
+            maxDepth (int): the max depth of every tree
+            minSample (int): the minimum samples in a node in order to split
+            n_estimators (int, optional): the number of trees. Defaults to 100.
+            maxFeatures (int | float | str, optional): the number of features scored by every node,
+                a fraction of the features, "sqrt" for their square root, or None for all of them.
+                Defaults to None.
+            bootstrap (bool, optional): grow every tree on a bootstrap sample of the rows,
+                otherwise on all of them. Defaults to True.
+            maxBins (int, optional): the number of histogram bins per feature,
+                None to train on the exact values. Defaults to None.
+            categorical (list, optional): the names of the categorical features,
+                None to infer them from the training data. Defaults to None.
+            n_jobs (int, optional): the number of worker processes growing the trees,
+                -1 for one per core. Defaults to None (serial).
+            random_state (int, optional): the seed of the bootstrap samples and the feature subsets.
+                Defaults to None.
+        """
+
+        if n_estimators < 1:
+            raise ValueError(f"n_estimators must be a positive number, got {n_estimators}")
+        if n_jobs is not None and not (n_jobs == -1 or n_jobs >= 1):
+            raise ValueError(f"n_jobs must be -1 or a positive number, got {n_jobs}")
+
+        self.train = data
+        self.maxDepth = maxDepth
+        self.minSample = minSample
+        self.n_estimators = n_estimators
+        self.maxFeatures = maxFeatures
+        self.bootstrap = bootstrap
+        self.maxBins = maxBins
+        self.categorical = categorical
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+        # the training column names, shared by all the trees
+        self.columns = data.labels
+
+        # the fitted trees, and their out-of-bag score (see _oob_score)
+        self.trees = []
+        self.oob_score = None
+        
+        # the trees stacked for prediction, averaging their outputs (see _output)
+        self.stacked : StackedTrees = None
+
+        # one independent seed per tree, so the forest doesn't depend on which process grew which tree
+        self._seeds = None
+
+
+    def _tree(self, data: TrainingData):
+        """
+        Make a single unfitted tree of the forest.
+            This method is expanded later in the child classes
+
+        Args:
+            data (TrainingData): the shared training data
+        """
+        pass
+
+
+    def _n_features(self, n: int):
+        """
+        The number of features scored by every node
+
+        Args:
+            n (int): the number of features
+
+        Returns:
+            int: the number of features, None for all of them
+        """
+
+        if self.maxFeatures is None:
+            return None
+        if self.maxFeatures == "sqrt":
+            return max(1, int(sqrt(n)))
+        if isinstance(self.maxFeatures, float):
+            return max(1, int(self.maxFeatures*n))
+
+        return self.maxFeatures
+
+
+    def _fitTree(self, k: int, columns: list):
+        """
+        Grow a single tree of the forest on its bootstrap sample,
+            and predict the training rows it left out
+
+        Args:
+            k (int): the index of the tree in the forest
+            columns (list): the decoded training columns (see TrainingData.decoded)
+
+        Returns:
+            tuple: the fitted tree, its out-of-bag rows and their predictions
+        """
+
+        train = self.train
+        n = len(train.y)
+        random = default_rng(self._seeds[k])
+
+        # the bootstrap sample is only a (sorted) index array into the shared training data
+        train.rows = sort(random.integers(0, n, n)) if self.bootstrap else arange(n)
+        train.random = random
+
+        tree = self._tree(train)
+        tree.fit()
+
+        oob = flatnonzero(bincount(train.rows, minlength=n) == 0)
+        predicted = tree.flat.predict([None if column is None else column[oob] for column in columns])
+
+        return tree, oob, predicted
+
+
+    def fit(self):
+        """
+        Grow the trees of the forest.
+            The schema and the histogram bins are prepared once, before the workers fork,
+            so every worker shares them as it shares the encoded training data.
+            The out-of-bag predictions of every tree are gathered into the out-of-bag score.
+            The training data is released once the trees are grown.
+        """
+
+        global _forked
+
+        if self.train is None:
+            raise RuntimeError("the forest is already fitted, its training data was released")
+
+        train = self.train
+        self._seeds = SeedSequence(self.random_state).spawn(self.n_estimators)
+
+        # every column but the first and the label is a feature (see DecisionNode._bestSplit)
+        features = len(train.labels) - 2
+        train.maxFeatures = self._n_features(features)
+
+        template = self._tree(train)
+        template._shared_schema(train)
+        if self.maxBins is not None:
+            train.bins = FeatureBins(train.X, self.maxBins, template.root._binned_target(), train.schema)
+
+        columns = train.decoded()
+
+        try:
+            if self.n_jobs not in (None, 1) and "fork" in get_all_start_methods():
+                processes = cpu_count() if self.n_jobs == -1 else self.n_jobs
+                _forked = (self, columns)
+                try:
+                    with get_context("fork").Pool(min(processes, self.n_estimators)) as pool:
+                        fitted = pool.map(_fit_forked, range(self.n_estimators), chunksize=1)
+                finally:
+                    _forked = None
+            else:
+                fitted = [self._fitTree(k, columns) for k in range(self.n_estimators)]
+        finally:
+            train.maxFeatures = train.random = None
+
+        self.trees = [tree for tree, _, _ in fitted]
+        self.stacked = StackedTrees([tree.flat for tree in self.trees],
+                                    [self._output(tree.flat) for tree in self.trees],
+                                    full(len(self.trees), 1/len(self.trees)))
+        if self.bootstrap:
+            self.oob_score = self._oob_score(train, [(oob, predicted) for _, oob, predicted in fitted])
+
+        self.train = None
+
+
+    def _oob_score(self, data: TrainingData, predictions: list):
+        """
+        Score the out-of-bag predictions of the trees against the training labels.
+            This method is expanded later in the child classes
+
+        Args:
+            data (TrainingData): the training data
+            predictions (list): the out-of-bag rows and their predictions, of every tree
+        """
+        pass
+
+
+    def _output(self, tree: FlatTree):
+        """
+        The numeric output of every node of a tree, averaged over the trees.
+            This method is expanded later in the child classes
+
+        Args:
+            tree (FlatTree): the compiled tree
+        """
+        pass
+
+
+    def _vote(self, average):
+        """
+        Turn the average output of the trees into predictions.
+            This method is expanded later in the child classes
+
+        Args:
+            average (np.ndarray): the average output of the trees on every sample
+        """
+        pass
+
+
+    def _columns(self, X):
+        """
+        Split the samples into one array per training data column (see DecisionTree._columns)
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            list: the column arrays
+        """
+
+        return self.trees[0]._columns(X)
+
+
+    def predict_batch(self, X):
+        """
+        Predict every row of X at once
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            np.ndarray: the predictions
+        """
+
+        if self.stacked is None:
+            raise RuntimeError("the forest must be fitted before predicting")
+
+        # all the trees are routed at once, they share the training columns
+        return self._vote(self.stacked.predict(self._columns(X)))
+
+
+    def predict(self, samp):
+        """
+        Predict a single sample
+
+        Args:
+            samp (pd.Series | list): the sample
+
+        Returns:
+            any: the prediction
+        """
+
+        return self.predict_batch(DataFrame([samp]) if isinstance(samp, Series) else [samp])[0]
+
+
+class RandomForestClassifier(RandomForest):
+    """
+    A Random Forest of Classification Trees Definition
+
+    Args:
+        RandomForest: the parent class
+    """
+    def __init__(self, data: DataFrame, maxDepth: int, minSample: int, n_estimators: int=100,
+                 maxFeatures="sqrt", bootstrap: bool=True, maxBins: int=None, categorical: list=None,
+                 n_jobs: int=None, random_state: int=None):
+        """
+        Random Forest Classifier Constructor (see RandomForest)
+
+        Args:
+            data (pd.DataFrame): the training data
+            maxFeatures (int | float | str, optional): the number of features scored by every node.
+                Defaults to "sqrt".
+        """
+
+        super().__init__(TrainingData(data, labelName), maxDepth, minSample, n_estimators, maxFeatures,
+                         bootstrap, maxBins, categorical, n_jobs, random_state)
+
+
+    def _tree(self, data: TrainingData):
+        """
+        Make a single unfitted classification tree
+
+        Args:
+            data (TrainingData): the shared training data
+
+        Returns:
+            DTClassifier: the tree
+        """
+
+        return DTClassifier(data, self.maxDepth, self.minSample, self.maxBins, self.categorical)
+
+
+    def _oob_score(self, data: TrainingData, predictions: list):
+        """
+        The accuracy of the out-of-bag majority vote, over the rows left out by any tree
+
+        Args:
+            data (TrainingData): the training data
+            predictions (list): the out-of-bag rows and their predictions, of every tree
+
+        Returns:
+            float: the out-of-bag accuracy
+        """
+
+        votes, counts = zeros(len(data.y)), zeros(len(data.y))
+        for oob, predicted in predictions:
+            votes[oob] += predicted == cls_y
+            counts[oob] += 1
+
+        scored = flatnonzero(counts)
+        positive = data.y == data.encode(data.label, cls_y)
+
+        return mean((2*votes[scored] > counts[scored]) == positive[scored])
+
+
+    def _output(self, tree: FlatTree):
+        """
+        A vote for cls_y at every node predicting it, so the average is the share of cls_y votes
+
+        Args:
+            tree (FlatTree): the compiled tree
+
+        Returns:
+            np.ndarray: the vote of every node
+        """
+
+        return tree.value == cls_y
+
+
+    def _vote(self, average):
+        """
+        The majority class of the trees
+
+        Args:
+            average (np.ndarray): the share of the trees voting for cls_y, on every sample
+
+        Returns:
+            np.ndarray: the predicted classes
+        """
+
+        return where(average > 0.5, cls_y, cls_x).astype(object)
+
+
+class RandomForestRegressor(RandomForest):
+    """
+    A Random Forest of Regression Trees Definition
+
+    Args:
+        RandomForest: the parent class
+    """
+    def __init__(self, data: DataFrame, maxDepth: int, minSample: int, n_estimators: int=100,
+                 maxFeatures=None, bootstrap: bool=True, maxBins: int=None, categorical: list=None,
+                 n_jobs: int=None, random_state: int=None):
+        """
+        Random Forest Regressor Constructor (see RandomForest)
+
+        Args:
+            data (pd.DataFrame): the training data
+        """
+
+        super().__init__(TrainingData(data, labelNumericName), maxDepth, minSample, n_estimators, maxFeatures,
+                         bootstrap, maxBins, categorical, n_jobs, random_state)
+
+
+    def _tree(self, data: TrainingData):
+        """
+        Make a single unfitted regression tree
+
+        Args:
+            data (TrainingData): the shared training data
+
+        Returns:
+            DTRegressor: the tree
+        """
+
+        return DTRegressor(data, self.maxDepth, self.minSample, self.maxBins, self.categorical)
+
+
+    def _oob_score(self, data: TrainingData, predictions: list):
+        """
+        The mean squared error of the out-of-bag mean, over the rows left out by any tree
+
+        Args:
+            data (TrainingData): the training data
+            predictions (list): the out-of-bag rows and their predictions, of every tree
+
+        Returns:
+            float: the out-of-bag mean squared error
+        """
+
+        sums, counts = zeros(len(data.y)), zeros(len(data.y))
+        for oob, predicted in predictions:
+            sums[oob] += predicted
+            counts[oob] += 1
+
+        scored = flatnonzero(counts)
+
+        return mean((sums[scored]/counts[scored] - data.y[scored])**2)
+
+
+    def _output(self, tree: FlatTree):
+        """
+        The predicted value of every node
+
+        Args:
+            tree (FlatTree): the compiled tree
+
+        Returns:
+            np.ndarray: the value of every node
+        """
+
+        return tree.value
+
+
+    def _vote(self, average):
+        """
+        The mean prediction of the trees
+
+        Args:
+            average (np.ndarray): the mean prediction of the trees, on every sample
+
+        Returns:
+            np.ndarray: the predicted values
+        """
+
+        return average
@@ -0,0 +1,196 @@
+from pandas import DataFrame, Series
+from numpy import empty, full, mean, arange, sort
+from numpy.random import default_rng
+
+from ScratchML._model_types import PredictionModel
+from ScratchML.consts import labelNumericName
+from ScratchML.DecisionTrees._abstract import TrainingData, DecisionTree
+from ScratchML.DecisionTrees._flat import StackedTrees, typed
+from ScratchML.DecisionTrees.regressor import DTRegressor
+
+
+class GradientBoostingRegressor(PredictionModel):
+    """
+    Gradient Boost Regressor Definition.
+        Every round fits a shallow DTRegressor to the residuals of the rounds before it,
+        on the same training data. The residuals are a single array updated in place
+        by the contribution of the new tree, so a round costs a single tree.
+
+    Args:
+        PredictionModel: the parent class
+    """
+    def __init__(self, data: DataFrame, n_estimators: int=100, learning_rate: float=0.1,
+                 maxDepth: int=3, minSample: int=2, subsample: float=1.0, maxBins: int=None,
+                 categorical: list=None, n_iter_no_change: int=None, tol: float=0.0,
+                 random_state: int=None):
+        """
+        Gradient Boost Constructor
+
+        Args:
+            data (pd.DataFrame): the training data
+            n_estimators (int, optional): the maximal number of boosting rounds. Defaults to 100.
+            learning_rate (float, optional): the shrinkage of the contribution of every tree. Defaults to 0.1.
+            maxDepth (int, optional): the max depth of every tree. Defaults to 3.
+            minSample (int, optional): the minimum samples in a node in order to split. Defaults to 2.
+            subsample (float, optional): the fraction of the training rows drawn (without replacement)
+                to fit every tree, 1.0 for all of them. Defaults to 1.0.
+            maxBins (int, optional): the number of histogram bins per feature,
+                None to train on the exact values. Defaults to None.
+            categorical (list, optional): the names of the categorical features,
+                None to infer them from the training data. Defaults to None.
+            n_iter_no_change (int, optional): stop once the validation loss didn't improve by
+                more than tol for this many rounds, None to fit every round. Defaults to None.
+            tol (float, optional): the least improvement of the validation loss. Defaults to 0.0.
+            random_state (int, optional): the seed of the row subsampling. Defaults to None.
+        """
+        
+        if n_estimators < 1:
+            raise ValueError(f"n_estimators must be a positive number, got {n_estimators}")
+        if learning_rate <= 0:
+            raise ValueError(f"learning_rate must be positive, got {learning_rate}")
+        if not 0 < subsample <= 1:
+            raise ValueError(f"subsample must be in (0, 1], got {subsample}")
+        if n_iter_no_change is not None and n_iter_no_change < 1:
+            raise ValueError(f"n_iter_no_change must be a positive number, got {n_iter_no_change}")
+        
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.maxDepth = maxDepth
+        self.minSample = minSample
+        self.subsample = subsample
+        self.maxBins = maxBins
+        self.categorical = categorical
+        self.n_iter_no_change = n_iter_no_change
+        self.tol = tol
+        self.random_state = random_state
+        
+        # encoded once, and shared by the trees of every round
+        self.train = TrainingData(data, labelNumericName)
+        
+        # the training column names, shared by all the trees
+        self.columns = self.train.labels
+        
+        # the initial prediction, the fitted trees and the loss of every round
+        self.init = None
+        self.trees = []
+        
+        # the trees stacked for prediction (see StackedTrees), None if no tree was kept
+        self.stacked : StackedTrees = None
+        self.train_loss = []
+        self.validation_loss = []
+    
+    
+    def fit(self, validation: DataFrame=None):
+        """
+        Fit the boosting rounds.
+            The trees are fitted to the residuals, which are the label of the shared
+            training data, and the new tree contribution is subtracted from them in place.
+            With a validation set, its predictions are kept up to date the same way,
+            one tree per round, and its loss is recorded every round (see validation_loss).
+            With early stopping (n_iter_no_change) as well, the rounds stop once the loss
+            stopped improving, and the model is cut back to the round of the least loss.
+            The training data is released once the rounds are done.
+
+        Args:
+            validation (pd.DataFrame, optional): the validation data, holding the true labels,
+                scored after every round. Defaults to None.
+        """
+        
+        if self.train is None:
+            raise RuntimeError("the model is already fitted, its training data was released")
+        if self.n_iter_no_change is not None and validation is None:
+            raise ValueError("early stopping (n_iter_no_change) needs a validation set")
+        
+        train = self.train
+        n = len(train.rows)
+        columns = train.decoded()
+        rng = default_rng(self.random_state)
+        
+        # the residuals replace the label of the training data, in a single preallocated array
+        self.init = mean(train.y)
+        residuals = empty(n)
+        residuals[:] = train.y
+        residuals -= self.init
+        train.y = residuals
+        
+        if validation is not None:
+            validation_columns = typed(self._columns(validation))
+            truth = validation[labelNumericName].values.astype(float)
+            predicted = full(len(truth), self.init)
+            best, best_loss = 0, float('inf')
+        
+        for k in range(self.n_estimators):
+            if self.subsample < 1:
+                train.rows = sort(rng.choice(n, max(1, int(self.subsample*n)), replace=False))
+            else:
+                train.rows = arange(n)
+            
+            tree = DTRegressor(train, self.maxDepth, self.minSample, self.maxBins, self.categorical)
+            tree.fit()
+            self.trees.append(tree)
+            
+            residuals -= self.learning_rate*tree.flat.predict(columns)
+            self.train_loss.append(mean(residuals**2))
+            
+            if validation is None:
+                continue
+            
+            predicted += self.learning_rate*tree.flat.predict(validation_columns)
+            loss = mean((truth - predicted)**2)
+            self.validation_loss.append(loss)
+            
+            if loss < best_loss - self.tol:
+                best, best_loss = k + 1, loss
+            elif self.n_iter_no_change is not None and k + 1 - best >= self.n_iter_no_change:
+                break
+        
+        # cut back to the round of the least validation loss
+        if validation is not None and self.n_iter_no_change is not None:
+            del self.trees[best:]
+        
+        if self.trees:
+            self.stacked = StackedTrees([tree.flat for tree in self.trees],
+                                        weights=full(len(self.trees), self.learning_rate), bias=self.init)
+        
+        self.train = None
+    
+    
+    # the trees share the training columns, split the samples as a tree would,
+    # before any tree is fitted (the validation set is split up front)
+    _columns = DecisionTree._columns
+    
+    
+    def predict_batch(self, X):
+        """
+        Predict every row of X at once
+
+        Args:
+            X (pd.DataFrame | np.ndarray): the samples, a DataFrame is matched to the
+                training columns by name, an array must keep the training column layout
+
+        Returns:
+            np.ndarray: the predicted values
+        """
+        
+        if self.init is None:
+            raise RuntimeError("the model must be fitted before predicting")
+        
+        if self.stacked is None:
+            return full(len(X), self.init)
+        
+        # all the trees are routed at once, they share the training columns
+        return self.stacked.predict(self._columns(X))
+    
+    
+    def predict(self, samp):
+        """
+        Predict the value of a single sample
+
+        Args:
+            samp (pd.Series | list): the sample
+
+        Returns:
+            float: the predicted value
+        """
+        
+        return self.predict_batch(DataFrame([samp]) if isinstance(samp, Series) else [samp])[0]
@@ -2,5 +2,7 @@ import os, sys
 sys.path.insert(0, os.path.abspath(".."))
 sys.path.insert(0, os.path.dirname(__file__))
 
+import dataset
 import DecisionTrees
+import Ensembles
 import consts
\ No newline at end of file
@@ -1,22 +1,43 @@
-from pandas import read_csv
-
-df = read_csv('data.csv')
-
-train = df.iloc[0:8040]
-validation = df.iloc[8040:10050]
-test = df.iloc[10050:12563]
+import os
+from ScratchML.dataset import Dataset
 
 labelName = 'area_type'
 labelNumericName = 'price in rupees'
 
+dataset = Dataset(os.path.join(os.path.dirname(__file__), 'data.csv'), labelName, splits={
+    'train': (0, 8040),
+    'validation': (8040, 10050),
+    'test': (10050, 12563),
+})
+
 labels = ['availability','bedrooms','total_sqft','bath','balcony','ranked','price in rupees', 'area_type']
 
 labels_cls = ['availability','bedrooms','total_sqft','bath','balcony','ranked','price in rupees']
 labels_rgr = ['area_type','availability','bedrooms','total_sqft','bath','balcony','ranked']
 
-labelIndex = df.columns.get_loc(labelName)
-
-labelNumericIndex = df.columns.get_loc(labelNumericName)
-
 cls_x = 'B' 
-cls_y = 'P'
\ No newline at end of file
+cls_y = 'P'
+
+
+def __getattr__(name):
+    """
+    Load the data only when it is first used, not on import
+
+    Args:
+        name (str): the attribute name
+
+    Returns:
+        pd.DataFrame | int: the whole data (df), one of its splits,
+            or the position of a label column (labelIndex, labelNumericIndex)
+    """
+    
+    if name == 'labelIndex':
+        return dataset.columns.get_loc(labelName)
+    if name == 'labelNumericIndex':
+        return dataset.columns.get_loc(labelNumericName)
+    if name == 'df':
+        return dataset.frame
+    if name in dataset.splits:
+        return dataset.split(name)
+    
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,194 @@
+import os, json
+from shutil import rmtree
+from tempfile import mkdtemp
+from numpy import load, save
+from pandas import DataFrame, Index, Categorical, read_csv
+
+
+class Dataset:
+    """
+    Dataset Definition.
+        The CSV file is parsed once, into a cache directory holding a .npy file
+        per column and a metadata file. Later loads memory-map the cached columns,
+        so every process opening the dataset shares the same pages.
+        A text column is cached as its integer codes, its categories are kept in the metadata.
+    """
+    
+    # the cache layout, a cache of another layout is converted again
+    FORMAT = 2
+    
+    def __init__(self, path: str, label: str, splits: dict=None, cache: str=None):
+        """
+        Dataset Constructor
+
+        Args:
+            path (str): the path of the CSV file
+            label (str): the name of the label column
+            splits (dict, optional): the (start, end) rows of every named split,
+                e.g. {"train": (0, 8040)}. Defaults to None.
+            cache (str, optional): the cache directory. Defaults to the CSV path with a .cache suffix.
+        """
+        
+        self.path = os.path.abspath(path)
+        self.label = label
+        self.splits = {} if splits is None else dict(splits)
+        self.cache = os.path.splitext(self.path)[0] + ".cache" if cache is None else os.path.abspath(cache)
+        
+        self._meta = None
+        self._frame = None
+    
+    
+    @property
+    def columns(self):
+        """
+        The column names, without loading the data
+
+        Returns:
+            pd.Index: the column names
+        """
+        
+        if self._meta is None and not self._cached():
+            return read_csv(self.path, nrows=0).columns
+        
+        return Index(self._metadata()["columns"])
+    
+    
+    @property
+    def label_index(self):
+        """
+        The position of the label column
+
+        Returns:
+            int: the label column index
+        """
+        
+        return self.columns.get_loc(self.label)
+    
+    
+    @property
+    def frame(self):
+        """
+        The whole dataset, on the memory-mapped cached columns
+
+        Returns:
+            pd.DataFrame: the dataset
+        """
+        
+        if self._frame is None:
+            meta = self._metadata()
+            columns = {}
+            for i, name in enumerate(meta["columns"]):
+                column = load(os.path.join(self.cache, f"{i}.npy"), mmap_mode="r")
+                # the categorical wraps the mapped codes, they are not copied
+                categories = meta["categories"].get(str(i))
+                columns[name] = column if categories is None else Categorical.from_codes(column, categories)
+            self._frame = DataFrame(columns, copy=False)
+        
+        return self._frame
+    
+    
+    def split(self, name: str):
+        """
+        A named split of the dataset
+
+        Args:
+            name (str): the split name
+
+        Returns:
+            pd.DataFrame: the split rows
+        """
+        
+        if name not in self.splits:
+            raise KeyError(f"unknown split {name!r}, expected one of {list(self.splits)}")
+        
+        start, end = self.splits[name]
+        return self.frame.iloc[start:end]
+    
+    
+    def _source(self):
+        """
+        The identity of the CSV file, a changed file invalidates the cache
+
+        Returns:
+            dict: the size and the modification time of the CSV file
+        """
+        
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    
+    
+    def _cached(self):
+        """
+        Whether the cache is up to date with the CSV file
+
+        Returns:
+            bool: is the cache usable?
+        """
+        
+        try:
+            with open(os.path.join(self.cache, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        if meta.get("source") != self._source() or meta.get("format") != Dataset.FORMAT:
+            return False
+        
+        self._meta = meta
+        return True
+    
+    
+    def _metadata(self):
+        """
+        The cache metadata, converting the CSV file first if needed
+
+        Returns:
+            dict: the metadata
+        """
+        
+        if self._meta is None and not self._cached():
+            self._convert()
+        
+        return self._meta
+    
+    
+    def _convert(self):
+        """
+        Parse the CSV file into the cache directory.
+            The cache is written aside and renamed into place, so concurrent
+            processes never see a partial cache.
+        """
+        
+        source = self._source()
+        df = read_csv(self.path)
+        
+        parent = os.path.dirname(self.cache)
+        staging = mkdtemp(dir=parent, prefix=".dataset-")
+        try:
+            categories = {}
+            for i, name in enumerate(df.columns):
+                column = df[name].values
+                # object arrays can't be memory-mapped, a text column is stored as its codes,
+                # in the integer type pandas picks for them (see frame)
+                if column.dtype == object:
+                    column = Categorical(column)
+                    categories[str(i)] = column.categories.tolist()
+                    column = column.codes
+                save(os.path.join(staging, f"{i}.npy"), column)
+            
+            meta = {"columns": list(df.columns), "rows": len(df), "source": source,
+                    "categories": categories, "format": Dataset.FORMAT}
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            
+            if os.path.isdir(self.cache):
+                rmtree(self.cache)
+            os.rename(staging, self.cache)
+        except OSError:
+            # another process renamed its own cache in first
+            rmtree(staging, ignore_errors=True)
+            if not self._cached():
+                raise
+            return
+        
+        self._meta = meta
@@ -2,4 +2,5 @@ import sys, os
 sys.path.insert(0, os.path.abspath(".."))
 sys.path.insert(0, os.path.dirname(__file__))
 
-import ScratchML.metrics.cls_metrics as cls_metrics
\ No newline at end of file
+import ScratchML.metrics.classification as classification
+import ScratchML.metrics.regression as regression
@@ -1,56 +1,256 @@
-from ScratchML._model_types import PredictionModel
-from pandas import DataFrame
+from pandas import Index, factorize
+from numpy import ndarray, asarray, concatenate, bincount, errstate, where, zeros, ix_, int64
 
-def confusion_matrix(y_true, y_pred, labelName, cls_x):
+
+def encode_labels(y_true, y_pred, labels=None):
+    """
+    Encode the true and the predicted labels together, once.
+        The labels are hashed rather than sorted, so encoding is linear in the samples.
+
+    Args:
+        y_true (list): the true labels
+        y_pred (list): the predicted labels
+        labels (list, optional): the classes, in the order of the encoding.
+            Defaults to None (every class seen, sorted).
+
+    Returns:
+        tuple: the codes of the true labels, the codes of the predicted labels and the classes
+    """
+    
+    y_true, y_pred = asarray(y_true), asarray(y_pred)
+    y = concatenate((y_true, y_pred))
+    
+    if labels is None:
+        codes, labels = factorize(y, sort=True)
+        labels = asarray(labels)
+    else:
+        labels = asarray(labels)
+        codes = Index(labels).get_indexer(y)
+        if (codes < 0).any():
+            raise ValueError(f"labels {sorted(set(y[codes < 0].tolist()))} are not in the classes")
+    
+    return codes[:len(y_true)], codes[len(y_true):], labels
+
+
+def confusion_matrix(y_true, y_pred, *, labels=None):
     """
     Generate the confusion matrix
 
     Args:
         y_true (list): the true labels
         y_pred (list): the predicted labels
-        labelName (str): the label name
-        cls_x (str): the class x
+        labels (list, optional): the classes, in the order of the matrix rows.
+            Defaults to None (every class seen, sorted).
         
     Returns:
-        dict: the confusion matrix
+        tuple: the confusion matrix, shaped (classes, classes) with the true classes
+            on the rows and the predicted ones on the columns, and the classes
+    """
+    
+    true, pred, labels = encode_labels(y_true, y_pred, labels)
+    k = len(labels)
+    
+    return bincount(true*k + pred, minlength=k*k).reshape(k, k), labels
+
+
+def _divide(a: ndarray, b: ndarray):
+    """
+    Divide, where dividing by zero (an empty class) gives 0
+
+    Args:
+        a (np.ndarray): the numerator
+        b (np.ndarray): the denominator
+
+    Returns:
+        np.ndarray: the quotient
     """
     
-    TP = 0 # TRUE POSITIVE
-    TN = 0 # TRUE NEGATIVE
-    FP = 0 # FALSE POSITIVE
-    FN = 0 # FALSE NEGATIVE
+    a, b = asarray(a, dtype=float), asarray(b, dtype=float)
     
-    df = DataFrame({"true": y_true, "predicted": y_pred})
+    with errstate(divide="ignore", invalid="ignore"):
+        return where(b == 0, 0.0, a / b)
+
+
+def confusion_metrics(cm: ndarray, labels, positive=None):
+    """
+    Calculate the metrics out of a confusion matrix
+
+    Args:
+        cm (np.ndarray): the confusion matrix (see confusion_matrix)
+        labels (list): the classes of the matrix rows
+        positive (any, optional): the positive class of the binary metrics. Defaults to None.
+
+    Returns:
+        dict: the metrics dictionary (see common_metrics)
+    """
     
-    df["true"] = df["true"] \
-        .apply(lambda x: 1 if x == cls_x else 0) # one-hot encoding
-    df["predicted"] = df["predicted"] \
-        .apply(lambda x: 1 if x == cls_x else 0) # one-hot encoding
+    cm, labels = asarray(cm), list(asarray(labels).tolist())
     
-    PP = df[df["true"] == 1] # Positive Predicted
-    TP = len(PP[PP["predicted"] == 1]) # True Positive
-    FP = len(PP[PP["predicted"] == 0]) # False Positive
+    tp = cm.diagonal()
+    fp = cm.sum(axis=0) - tp
+    fn = cm.sum(axis=1) - tp
+    total = cm.sum()
     
-    NN = df[df["true"] == 0] # Negative Predicted 
-    TN = len(NN[NN["predicted"] == 0]) # True Negative
-    FN = len(NN[NN["predicted"] == 1]) # False Negative
+    precision = _divide(tp, tp + fp)
+    recall = _divide(tp, tp + fn)
+    f1_score = _divide(2*tp, 2*tp + fp + fn)
     
+    metrics = {
+        "accuracy": float(_divide(tp.sum(), total)),
+        "per_class": {
+            label: {"precision": float(p), "recall": float(r), "f1_score": float(f), "support": int(s)}
+            for label, p, r, f, s in zip(labels, precision, recall, f1_score, tp + fn)
+        },
+        "macro": {
+            "precision": float(precision.mean()) if len(labels) else 0.0,
+            "recall": float(recall.mean()) if len(labels) else 0.0,
+            "f1_score": float(f1_score.mean()) if len(labels) else 0.0,
+        },
+        "micro": {
+            "precision": float(_divide(tp.sum(), tp.sum() + fp.sum())),
+            "recall": float(_divide(tp.sum(), tp.sum() + fn.sum())),
+            "f1_score": float(_divide(2*tp.sum(), 2*tp.sum() + fp.sum() + fn.sum())),
+        },
+    }
+    
+    if positive is not None:
+        # a positive class that never occurs has no counts at all
+        i = labels.index(positive) if positive in labels else None
+        TP, FP, FN = (0, 0, 0) if i is None else (tp[i], fp[i], fn[i])
+        TN = total - TP - FP - FN
+        
+        recall_p, specificity = float(_divide(TP, TP + FN)), float(_divide(TN, TN + FP))
+        metrics.update({
+            "recall": recall_p,
+            "specificity": specificity,
+            "precision": float(_divide(TP, TP + FP)),
+            "f1_score": float(_divide(2*TP, 2*TP + FP + FN)),
+            # the area under the roc curve of hard predictions (a single operating point)
+            "auc": (recall_p + specificity)/2,
+        })
     
-    return {"TP": TP, "TN": TN, "FP": FP, "FN": FN}
+    return metrics
 
-def common_metrics(y_true, y_pred, labelName, cls_x):
+
+class ConfusionAccumulator:
+    """
+    Streaming Confusion Matrix Definition.
+        The confusion matrix is accumulated chunk by chunk, and accumulators
+        of different chunks (or processes) are merged into one.
+        Without fixed classes, the matrix grows with every new class seen.
     """
-    Calculate the accuracy
+    def __init__(self, labels=None):
+        """
+        Confusion Accumulator Constructor
+
+        Args:
+            labels (list, optional): the classes, fixed in advance. Defaults to None.
+        """
+        
+        self.fixed = labels is not None
+        self.labels = [] if labels is None else list(asarray(labels).tolist())
+        self.matrix = zeros((len(self.labels), len(self.labels)), dtype=int64)
+    
+    
+    def update(self, y_true, y_pred):
+        """
+        Accumulate a chunk of predictions
+
+        Args:
+            y_true (list): the true labels of the chunk
+            y_pred (list): the predicted labels of the chunk
+
+        Returns:
+            ConfusionAccumulator: the accumulator itself
+        """
+        
+        if self.fixed:
+            cm, _ = confusion_matrix(y_true, y_pred, labels=self.labels)
+            self.matrix += cm
+            return self
+        
+        return self._add(*confusion_matrix(y_true, y_pred))
+    
+    
+    def merge(self, other):
+        """
+        Merge the predictions accumulated by another accumulator
+
+        Args:
+            other (ConfusionAccumulator): the other accumulator
+
+        Returns:
+            ConfusionAccumulator: the accumulator itself
+        """
+        
+        return self._add(other.matrix, other.labels)
+    
+    
+    def _add(self, cm: ndarray, labels):
+        """
+        Add a confusion matrix over the given classes
+
+        Args:
+            cm (np.ndarray): the confusion matrix
+            labels (list): the classes of the matrix rows
+
+        Returns:
+            ConfusionAccumulator: the accumulator itself
+        """
+        
+        labels = list(asarray(labels).tolist())
+        positions = {label: i for i, label in enumerate(self.labels)}
+        
+        new = [label for label in labels if label not in positions]
+        if new and self.fixed:
+            raise ValueError(f"labels {sorted(new)} are not in the classes")
+        
+        # grow the matrix with the classes seen for the first time
+        if new:
+            positions.update((label, len(self.labels) + i) for i, label in enumerate(new))
+            self.labels += new
+            grown = zeros((len(self.labels), len(self.labels)), dtype=int64)
+            grown[:len(self.matrix), :len(self.matrix)] = self.matrix
+            self.matrix = grown
+        
+        index = [positions[label] for label in labels]
+        self.matrix[ix_(index, index)] += cm
+        
+        return self
+    
+    
+    def result(self, positive=None):
+        """
+        The metrics of all the accumulated predictions
+
+        Args:
+            positive (any, optional): the positive class of the binary metrics. Defaults to None.
+
+        Returns:
+            dict: the metrics dictionary (see common_metrics)
+        """
+        
+        return confusion_metrics(self.matrix, self.labels, positive)
+
+
+def common_metrics(y_true, y_pred, *, positive=None, labels=None):
+    """
+    Calculate the common classification metrics
 
     Args:
         y_true (list): the true labels
         y_pred (list): the predicted labels
-        labelName (str): the label name
-        cls_x (str): the class x
+        positive (any, optional): the positive class of the binary metrics,
+            e.g. cls_x. Defaults to None (multi-class metrics only).
+        labels (list, optional): the classes. Defaults to None (every class seen).
         
     Returns:
         dict: the common metrics dictionary, containing:
             - accuracy (float): the accuracy
+            - per_class (dict): the precision, recall, f1-score and support of every class
+            - macro (dict): the precision, recall and f1-score averaged over the classes
+            - micro (dict): the precision, recall and f1-score of the pooled counts
+            and with a positive class:
             - recall (float): the recall
             - specificity (float): the specificity
             - precision (float): the precision
@@ -59,14 +259,6 @@ def common_metrics(y_true, y_pred, labelName, cls_x):
             
     """
     
-    cm = confusion_matrix(y_true, y_pred, labelName, cls_x)
-    
+    cm, labels = confusion_matrix(y_true, y_pred, labels=labels)
     
-    return {
-        "accuracy": (cm["TP"]+cm["TN"])/(cm["TP"]+cm["TN"]+cm["FP"]+cm["FN"]),
-        "recall": cm["TP"]/(cm["TP"]+cm["FN"]),
-        "specificity": cm["TN"]/(cm["TN"]+cm["FP"]),
-        "precision": cm["TP"]/(cm["TP"]+cm["FP"]),
-        "f1_score": 2*cm["TP"]/(2*cm["TP"]+cm["FP"]+cm["FN"]),
-        "auc": (cm["TP"]+0.5*cm["FP"])/(cm["TP"]+cm["FN"]+cm["FP"]),
-    }
\ No newline at end of file
+    return confusion_metrics(cm, labels, positive)
@@ -1,11 +1,118 @@
-from ScratchML._model_types import PredictionModel
-from pandas import DataFrame
-from numpy import mean, sum, square, subtract, unique, ndarray
+from numpy import asarray, absolute, nan, errstate
+
+
+class RegressionMetricsAccumulator:
+    """
+    Streaming Regression Metrics Definition.
+        The metrics are accumulated chunk by chunk in one pass, and accumulators
+        of different chunks (or processes) are merged into one.
+        The variance of the true values is kept as running moments (count, mean and
+        sum of squared deviations), which are merged without loss of precision.
+    """
+    def __init__(self):
+        """
+        Regression Metrics Accumulator Constructor
+        """
+        
+        self.n = 0
+        self.sse = 0.0  # sum of squared errors
+        self.sae = 0.0  # sum of absolute errors
+        self.mean = 0.0 # mean of the true values
+        self.m2 = 0.0   # sum of squared deviations of the true values from their mean
+
+
+    def update(self, y_true, y_pred):
+        """
+        Accumulate a chunk of predictions
+
+        Args:
+            y_true (list): the true values of the chunk
+            y_pred (list): the predicted values of the chunk
+
+        Returns:
+            RegressionMetricsAccumulator: the accumulator itself
+        """
+        
+        y_true = asarray(y_true, dtype=float)
+        error = y_true - asarray(y_pred, dtype=float)
+        
+        if len(y_true) == 0:
+            return self
+        
+        mean = y_true.mean()
+        deviation = y_true - mean
+        
+        chunk = RegressionMetricsAccumulator()
+        chunk.n = len(y_true)
+        chunk.sse = float(error @ error)
+        chunk.sae = float(absolute(error).sum())
+        chunk.mean = float(mean)
+        chunk.m2 = float(deviation @ deviation)
+        
+        return self.merge(chunk)
+
+
+    def merge(self, other):
+        """
+        Merge the predictions accumulated by another accumulator
+
+        Args:
+            other (RegressionMetricsAccumulator): the other accumulator
+
+        Returns:
+            RegressionMetricsAccumulator: the accumulator itself
+        """
+        
+        if other.n == 0:
+            return self
+        
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        
+        # Chan et al. pairwise update of the mean and the squared deviations
+        self.m2 += other.m2 + delta**2 * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.sse += other.sse
+        self.sae += other.sae
+        self.n = n
+        
+        return self
+
+
+    def result(self):
+        """
+        The metrics of all the accumulated predictions
+
+        Returns:
+            dict: the metrics dictionary, containing:
+                - mse (float): the mean squared error
+                - r2 (float): the coefficient of determination
+                - mae (float): the mean absolute error
+        """
+        
+        if self.n == 0:
+            return {"mse": nan, "r2": nan, "mae": nan}
+        
+        with errstate(divide="ignore", invalid="ignore"):
+            r2 = 1 - asarray(self.sse) / asarray(self.m2)
+        
+        return {
+            "mse": self.sse / self.n,
+            "r2": float(r2),
+            "mae": self.sae / self.n,
+        }
+
 
 def common_metrics(y_true, y_pred):
+    """
+    Calculate the common regression metrics
+
+    Args:
+        y_true (list): the true values
+        y_pred (list): the predicted values
+
+    Returns:
+        dict: the metrics dictionary (see RegressionMetricsAccumulator.result)
+    """
     
-    return {
-        "mse": square(subtract(y_true,y_pred)).mean(),
-        "r2": 1 - (square(subtract(y_true,y_pred)).sum() / square(subtract(y_true,mean(y_true))).sum()),
-        "mae": abs(subtract(y_true,y_pred)).mean()
-    }
\ No newline at end of file
+    return RegressionMetricsAccumulator().update(y_true, y_pred).result()
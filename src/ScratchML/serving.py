@@ -0,0 +1,477 @@
+import os, sys, json, asyncio
+from argparse import ArgumentParser
+from collections import deque
+from time import perf_counter
+from pandas import DataFrame
+from numpy import percentile
+
+# the HTTP reason phrases of the answered statuses
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+# the largest request body accepted
+MAX_BODY = 1 << 24
+
+
+def load_model(path: str, mmap: bool=True):
+    """
+    Load a tree saved by DecisionTree.save(), of the model its header names
+
+    Args:
+        path (str): the directory the tree was saved into
+        mmap (bool, optional): memory-map the arrays instead of reading them. Defaults to True.
+
+    Returns:
+        DecisionTree: the loaded tree
+    """
+
+    from ScratchML.DecisionTrees.classifier import DTClassifier
+    from ScratchML.DecisionTrees.regressor import DTRegressor
+
+    with open(os.path.join(path, "header.json")) as f:
+        model = json.load(f)["model"]
+
+    models = {cls.__name__: cls for cls in (DTClassifier, DTRegressor)}
+    if model not in models:
+        raise ValueError(f"{path} holds a {model}, which can't be served")
+
+    return models[model].load(path, mmap)
+
+
+class MicroBatcher:
+    """
+    Micro-Batcher Definition.
+        Concurrent requests are queued and answered together: a batch is closed once it holds
+        max_batch rows or max_wait seconds after its first request, and all its rows are
+        predicted with a single vectorized call, off the event loop.
+    """
+    def __init__(self, model, max_batch: int=256, max_wait: float=0.002, window: int=10000):
+        """
+        Micro-Batcher Constructor
+
+        Args:
+            model (PredictionModel): the fitted model, predicting with predict_batch
+            max_batch (int, optional): the most rows predicted at once. Defaults to 256.
+            max_wait (float, optional): the most seconds a request waits for its batch to fill.
+                Defaults to 0.002.
+            window (int, optional): the number of latest requests the latency percentiles
+                are taken over. Defaults to 10000.
+        """
+
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be a positive number, got {max_batch}")
+        if max_wait < 0:
+            raise ValueError(f"max_wait can't be negative, got {max_wait}")
+
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue = None
+        self._task = None
+
+        # the serving statistics (see stats)
+        self.started = perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=window)
+
+
+    def start(self):
+        """
+        Start batching, on the running event loop
+        """
+
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self.started = perf_counter()
+
+
+    async def stop(self):
+        """
+        Stop batching, the queued requests are cancelled
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+    async def predict(self, rows: list):
+        """
+        Predict the rows of a single request, within the next batch
+
+        Args:
+            rows (list): the samples, a dict of the column values each
+
+        Returns:
+            list: the prediction of every row
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future, perf_counter()))
+
+        return await future
+
+
+    async def _run(self):
+        """
+        Close and predict the batches, as long as the batcher runs
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+
+            # the batch fills until it is full or its first request waited long enough
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            rows = [row for request in batch for row in request[0]]
+            try:
+                # the event loop keeps accepting the next requests while the batch is predicted
+                predicted = await loop.run_in_executor(None, self._predict, rows)
+            except Exception:
+                # a single bad request fails the whole batch, every request is predicted on its own
+                # so it only fails its own client
+                await self._run_apart(batch)
+            else:
+                end, start = perf_counter(), 0
+                for requested, future, received in batch:
+                    if not future.done():
+                        future.set_result(predicted[start:start + len(requested)])
+                    start += len(requested)
+                    self.latencies.append(end - received)
+
+                self.requests += len(batch)
+                self.rows += len(rows)
+                self.batches += 1
+
+
+    async def _run_apart(self, batch: list):
+        """
+        Predict every request of a failed batch on its own, as a batch of its own
+
+        Args:
+            batch (list): the rows, the future and the arrival time of every request
+        """
+
+        loop = asyncio.get_running_loop()
+
+        for requested, future, received in batch:
+            try:
+                predicted = await loop.run_in_executor(None, self._predict, requested)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+                continue
+
+            if not future.done():
+                future.set_result(predicted)
+            self.latencies.append(perf_counter() - received)
+
+            self.requests += 1
+            self.rows += len(requested)
+            self.batches += 1
+
+    def _predict(self, rows: list):
+        """
+        Predict the rows of a batch at once
+
+        Args:
+            rows (list): the samples, a dict of the column values each
+
+        Returns:
+            list: the predictions, as JSON values
+        """
+
+        return self.model.predict_batch(DataFrame(rows)).tolist()
+
+
+    def stats(self):
+        """
+        The serving statistics since the batcher started
+
+        Returns:
+            dict: the number of requests, rows and batches, the throughput,
+                and the latency percentiles (in milliseconds) of the latest requests
+        """
+
+        elapsed = perf_counter() - self.started
+        latencies = list(self.latencies)
+        quantiles = percentile(latencies, [50, 90, 99, 100]).tolist() if latencies else [None]*4
+
+        return {
+            "uptime_seconds": elapsed,
+            "requests": self.requests,
+            "rows": self.rows,
+            "batches": self.batches,
+            "mean_batch_rows": self.rows/self.batches if self.batches else None,
+            "requests_per_second": self.requests/elapsed if elapsed > 0 else None,
+            "rows_per_second": self.rows/elapsed if elapsed > 0 else None,
+            "latency_ms": {name: None if q is None else q*1000
+                           for name, q in zip(("p50", "p90", "p99", "max"), quantiles)},
+        }
+
+
+class PredictionServer:
+    """
+    Prediction Server Definition.
+        A small HTTP/1.1 server on asyncio streams, with no dependency beyond the standard library:
+            POST /predict  {"rows": [{column: value, ...}, ...]} or {"row": {...}}
+                           answers {"predictions": [...]}
+            GET  /stats    the serving statistics (see MicroBatcher.stats)
+            GET  /health   {"status": "ok"}
+        Connections are kept alive, so a client may send its requests on a single connection.
+    """
+    def __init__(self, model, host: str="127.0.0.1", port: int=8000, max_batch: int=256, max_wait: float=0.002):
+        """
+        Prediction Server Constructor
+
+        Args:
+            model (PredictionModel): the fitted model, predicting with predict_batch
+            host (str, optional): the address to listen on. Defaults to "127.0.0.1" (localhost only).
+            port (int, optional): the port to listen on, 0 for any free port. Defaults to 8000.
+            max_batch (int, optional): the most rows predicted at once. Defaults to 256.
+            max_wait (float, optional): the most seconds a request waits for its batch to fill.
+                Defaults to 0.002.
+        """
+
+        self.host = host
+        self.port = port
+        self.batcher = MicroBatcher(model, max_batch, max_wait)
+        self._server = None
+
+        # the columns the tree splits on, which every row must hold: numbers for the numeric
+        # training columns, strings for the encoded ones (see TrainingData)
+        flat = model.flat
+        features = sorted(set(flat.feature[flat.left >= 0].tolist()))
+        self.numeric = [model.columns[f] for f in features if model.categories[f] is None]
+        self.text = [model.columns[f] for f in features if model.categories[f] is not None]
+
+
+    async def start(self):
+        """
+        Start listening, and batching
+
+        Returns:
+            int: the port listened on
+        """
+
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+        return self.port
+
+
+    async def stop(self):
+        """
+        Stop listening, and batching
+        """
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+
+    async def serve_forever(self):
+        """
+        Listen until cancelled
+        """
+
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answer the requests of a single connection
+
+        Args:
+            reader (asyncio.StreamReader): the connection input
+            writer (asyncio.StreamWriter): the connection output
+        """
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "malformed Content-Length header"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, payload = await self._handle(method, target, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _handle(self, method: str, target: str, body: bytes):
+        """
+        Answer a single request
+
+        Args:
+            method (str): the HTTP method
+            target (str): the request path
+            body (bytes): the request body
+
+        Returns:
+            tuple: the HTTP status and the JSON payload
+        """
+
+        path = target.split("?", 1)[0]
+
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.batcher.stats()
+        if path != "/predict":
+            return 404, {"error": f"no such endpoint {path}"}
+        if method != "POST":
+            return 405, {"error": "POST the rows to predict"}
+
+        try:
+            request = json.loads(body)
+            rows = request["rows"] if "rows" in request else [request["row"]]
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise TypeError("rows must be a list of objects")
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {"error": f"expected {{\"rows\": [...]}} or {{\"row\": {{...}}}}: {error}"}
+
+        if not rows:
+            return 200, {"predictions": []}
+
+        invalid = self._invalid(rows)
+        if invalid is not None:
+            return 400, {"error": invalid}
+
+        try:
+            return 200, {"predictions": await self.batcher.predict(rows)}
+        except Exception as error:
+            return 500, {"error": str(error)}
+
+
+    def _invalid(self, rows: list):
+        """
+        Check the rows of a request against the columns the tree splits on
+
+        Args:
+            rows (list): the samples, a dict of the column values each
+
+        Returns:
+            str: the first problem found, None if every row is valid
+        """
+
+        for k, row in enumerate(rows):
+            for name in self.numeric:
+                value = row.get(name)
+                if value is None:
+                    return f"row {k} misses the numeric feature {name!r}"
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    return f"row {k}: {name!r} must be a number, got {value!r}"
+            for name in self.text:
+                value = row.get(name)
+                if value is None:
+                    return f"row {k} misses the feature {name!r}"
+                if not isinstance(value, str):
+                    return f"row {k}: {name!r} must be a string, got {value!r}"
+
+        return None
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        """
+        Write a JSON response
+
+        Args:
+            writer (asyncio.StreamWriter): the connection output
+            status (int): the HTTP status
+            payload (dict): the JSON payload
+            keep_alive (bool): whether the connection stays open
+        """
+
+        body = json.dumps(payload).encode()
+        writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                      f"Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + body)
+        await writer.drain()
+
+
+def main(argv: list=None):
+    """
+    Serve a saved tree from the command line
+
+    Args:
+        argv (list, optional): the command line arguments. Defaults to sys.argv.
+    """
+
+    parser = ArgumentParser(description="Serve the predictions of a saved ScratchML tree over HTTP")
+    parser.add_argument("model", help="the directory the tree was saved into (see DecisionTree.save)")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="the port to listen on")
+    parser.add_argument("--max-batch", type=int, default=256, help="the most rows predicted at once")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="the most a request waits for its batch")
+    args = parser.parse_args(argv)
+
+    server = PredictionServer(load_model(args.model), args.host, args.port, args.max_batch, args.max_wait_ms/1000)
+    print(f"serving {args.model} on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
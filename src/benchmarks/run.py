@@ -0,0 +1,363 @@
+import os, sys, json, platform, tracemalloc
+from copy import deepcopy
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from itertools import product, chain
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy, pandas
+
+from ScratchML.consts import labelName, labelNumericName
+from ScratchML.DecisionTrees.classifier import DTClassifier
+from ScratchML.DecisionTrees.regressor import DTRegressor
+from ScratchML.metrics import classification, regression
+from benchmarks.synthetic import make_data
+
+# the grids of the benchmark cases, the quick grid is meant for a run on every change
+GRID = {
+    "rows": [2000, 8000, 32000],
+    "features": [0, 16],
+    "maxDepth": [4, 10],
+    "minSample": [2, 100],
+}
+QUICK_GRID = {
+    "rows": [2000, 8000],
+    "features": [0],
+    "maxDepth": [4, 10],
+    "minSample": [2],
+}
+
+
+def measure(function, repeat: int=3):
+    """
+    Time a function and record its peak memory.
+        The time is the best of the repeats, the peak memory is traced on a separate call,
+        so the tracing overhead doesn't count in the time.
+
+    Args:
+        function (callable): the function to measure, called with no arguments
+        repeat (int, optional): the number of timed calls. Defaults to 3.
+
+    Returns:
+        dict: the best time in seconds and the peak of the traced allocations in bytes
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        seconds.append(perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": min(seconds), "peak_bytes": peak}
+
+
+def _fit(model, data, maxDepth: int, minSample: int):
+    """
+    Fit a fresh tree on the data
+
+    Args:
+        model (type): DTClassifier or DTRegressor
+        data (pd.DataFrame): the training data
+        maxDepth (int): the max depth of the tree
+        minSample (int): the minimum samples in a node in order to split
+
+    Returns:
+        DecisionTree: the fitted tree
+    """
+
+    tree = model(data, maxDepth, minSample)
+    tree.fit()
+
+    return tree
+
+
+def tree_cases(grid: dict, repeat: int=3, seed: int=0):
+    """
+    Time the fit and the batch prediction of both trees over a grid
+
+    Args:
+        grid (dict): the rows, features, maxDepth and minSample values to combine
+        repeat (int, optional): the number of timed calls of every case. Defaults to 3.
+        seed (int, optional): the seed of the synthetic data. Defaults to 0.
+
+    Yields:
+        dict: the result of every case
+    """
+
+    for rows, features in product(grid["rows"], grid["features"]):
+        data = make_data(rows, features, seed)
+        for model, maxDepth, minSample in product((DTClassifier, DTRegressor), grid["maxDepth"], grid["minSample"]):
+            params = {"rows": rows, "features": features, "maxDepth": maxDepth, "minSample": minSample}
+
+            yield {"name": f"{model.__name__}.fit", "params": params,
+                   **measure(lambda: _fit(model, data, maxDepth, minSample), repeat)}
+
+            tree = _fit(model, data, maxDepth, minSample)
+            yield {"name": f"{model.__name__}.predict_batch", "params": params,
+                   **measure(lambda: tree.predict_batch(data), repeat)}
+
+
+def _error(tree, data):
+    """
+    The validation error of a tree, the lower the better
+
+    Args:
+        tree (DecisionTree): the fitted tree
+        data (pd.DataFrame): the validation data, holding the true labels
+
+    Returns:
+        float: the mse of a regressor, the misclassification rate of a classifier
+    """
+
+    score = tree._score(data, tree.predict_batch(data))
+
+    return float(score["mse"]) if "mse" in score else 1 - float(score["accuracy"])
+
+
+def _refresh(tree, batches: list):
+    """
+    Refresh a fitted tree with every batch in turn
+
+    Args:
+        tree (DecisionTree): the fitted tree
+        batches (list): the new samples, a DataFrame per batch
+
+    Returns:
+        DecisionTree: the refreshed tree
+    """
+
+    for batch in batches:
+        tree.partial_fit(batch)
+
+    return tree
+
+
+def refresh_cases(grid: dict, repeat: int=3, seed: int=0, batches: int=4):
+    """
+    Time the incremental refresh of both trees (see DecisionTree.partial_fit), and record
+        the validation error of the tree before and after it. The tree is fitted on three quarters
+        of the rows and refreshed with the last quarter, in batches of the same distribution.
+
+    Args:
+        grid (dict): the rows values, the deepest maxDepth and the smallest minSample are fitted
+        repeat (int, optional): the number of timed calls of every case. Defaults to 3.
+        seed (int, optional): the seed of the synthetic data. Defaults to 0.
+        batches (int, optional): the number of refresh batches. Defaults to 4.
+
+    Yields:
+        dict: the result of every case, with the stale and the refreshed validation errors
+    """
+
+    maxDepth, minSample = max(grid["maxDepth"]), min(grid["minSample"])
+
+    for rows in grid["rows"]:
+        data, validation = make_data(rows, seed=seed), make_data(rows//4, seed=seed + 1)
+        fitted = rows*3//4
+        new = [data.iloc[k:k + (rows - fitted)//batches] for k in range(fitted, rows, (rows - fitted)//batches)]
+
+        for model in (DTClassifier, DTRegressor):
+            params = {"rows": rows, "batches": batches, "maxDepth": maxDepth, "minSample": minSample}
+            tree = _fit(model, data.iloc[:fitted], maxDepth, minSample)
+
+            # every call refreshes a fresh copy, the traced call included
+            copies = [deepcopy(tree) for _ in range(repeat + 1)]
+            refreshed = _refresh(deepcopy(tree), new)
+
+            yield {"name": f"{model.__name__}.partial_fit", "params": params,
+                   **measure(lambda: _refresh(copies.pop(), new), repeat),
+                   "error_stale": _error(tree, validation), "error_refreshed": _error(refreshed, validation)}
+
+
+def metric_cases(grid: dict, repeat: int=3, seed: int=0):
+    """
+    Time the metrics functions over the row counts of a grid
+
+    Args:
+        grid (dict): the rows values
+        repeat (int, optional): the number of timed calls of every case. Defaults to 3.
+        seed (int, optional): the seed of the synthetic data. Defaults to 0.
+
+    Yields:
+        dict: the result of every case
+    """
+
+    for rows in grid["rows"]:
+        data, predicted = make_data(rows, seed=seed), make_data(rows, seed=seed + 1)
+        params = {"rows": rows}
+
+        y_true, y_pred = data[labelName].values, predicted[labelName].values
+        yield {"name": "classification.confusion_matrix", "params": params,
+               **measure(lambda: classification.confusion_matrix(y_true, y_pred), repeat)}
+        yield {"name": "classification.common_metrics", "params": params,
+               **measure(lambda: classification.common_metrics(y_true, y_pred), repeat)}
+
+        y_true, y_pred = data[labelNumericName].values, predicted[labelNumericName].values
+        yield {"name": "regression.common_metrics", "params": params,
+               **measure(lambda: regression.common_metrics(y_true, y_pred), repeat)}
+
+
+def run(grid: dict=None, repeat: int=3, seed: int=0, verbose: bool=False):
+    """
+    Run every benchmark case
+
+    Args:
+        grid (dict, optional): the grid of the cases (see GRID). Defaults to GRID.
+        repeat (int, optional): the number of timed calls of every case. Defaults to 3.
+        seed (int, optional): the seed of the synthetic data. Defaults to 0.
+        verbose (bool, optional): print every result as it is measured. Defaults to False.
+
+    Returns:
+        dict: the environment of the run and the result of every case
+    """
+
+    grid = GRID if grid is None else grid
+
+    results = []
+    for result in chain(tree_cases(grid, repeat, seed), refresh_cases(grid, repeat, seed),
+                        metric_cases(grid, repeat, seed)):
+        results.append(result)
+        if verbose:
+            print(f"{key(result):<90} {result['seconds']:10.4f}s {result['peak_bytes']/2**20:10.1f}MiB")
+
+    return {
+        "environment": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "grid": grid,
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def key(result: dict):
+    """
+    The identity of a case, matching a result to its baseline
+
+    Args:
+        result (dict): the result of the case
+
+    Returns:
+        str: the case name and parameters
+    """
+
+    return result["name"] + "(" + ", ".join(f"{k}={v}" for k, v in sorted(result["params"].items())) + ")"
+
+
+def compare(results: dict, baseline: dict, threshold: float=0.25, min_seconds: float=0.001):
+    """
+    Find the cases slower, or holding more memory, than their baseline by more than a threshold
+
+    Args:
+        results (dict): the run (see run)
+        baseline (dict): the baseline run
+        threshold (float, optional): the allowed relative increase. Defaults to 0.25.
+        min_seconds (float, optional): the cases faster than this in the baseline are too noisy
+            to flag on time. Defaults to 0.001.
+
+    Returns:
+        list: the regressions, with the measure, the baseline and the current value and their ratio
+    """
+
+    previous = {key(result): result for result in baseline["results"]}
+
+    regressions = []
+    for result in results["results"]:
+        base = previous.get(key(result))
+        if base is None:
+            continue
+
+        for measure_name in ("seconds", "peak_bytes"):
+            if measure_name == "seconds" and base["seconds"] < min_seconds:
+                continue
+            if base[measure_name] > 0 and result[measure_name] > base[measure_name]*(1 + threshold):
+                regressions.append({
+                    "case": key(result),
+                    "measure": measure_name,
+                    "baseline": base[measure_name],
+                    "current": result[measure_name],
+                    "ratio": result[measure_name]/base[measure_name],
+                })
+
+    return regressions
+
+
+def refresh_check(results: dict, slack: float=0.01):
+    """
+    Find the refreshed trees doing worse on the validation data than before their refresh.
+        The refresh batches are of the training distribution, so a refresh must not hurt.
+
+    Args:
+        results (dict): the run (see run)
+        slack (float, optional): the allowed relative increase of the error. Defaults to 0.01.
+
+    Returns:
+        list: the cases, with the stale and the refreshed errors
+    """
+
+    return [{"case": key(result), "stale": result["error_stale"], "refreshed": result["error_refreshed"]}
+            for result in results["results"]
+            if "error_refreshed" in result and result["error_refreshed"] > result["error_stale"]*(1 + slack)]
+
+
+def main(argv: list=None):
+    """
+    Run the benchmarks from the command line, save the results to JSON
+        and compare them to a baseline. The exit status is 1 when a regression is found,
+        or when a refreshed tree does worse than before its refresh (see refresh_check).
+
+    Args:
+        argv (list, optional): the command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: the exit status
+    """
+
+    parser = ArgumentParser(description="Time the ScratchML trees and metrics on synthetic data")
+    parser.add_argument("--out", default="benchmark.json", help="the JSON file of the results")
+    parser.add_argument("--baseline", help="a JSON file of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float, default=0.25, help="the allowed relative slowdown")
+    parser.add_argument("--repeat", type=int, default=3, help="the timed calls of every case")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the synthetic data")
+    parser.add_argument("--quick", action="store_true", help="run the small grid")
+    args = parser.parse_args(argv)
+
+    results = run(QUICK_GRID if args.quick else GRID, args.repeat, args.seed, verbose=True)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=1)
+
+    worse = refresh_check(results)
+    for found in worse:
+        print(f"WORSE AFTER REFRESH {found['case']}: {found['stale']:.4g} -> {found['refreshed']:.4g}")
+
+    if args.baseline is None:
+        return 1 if worse else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    for found in regressions:
+        print(f"REGRESSION {found['case']} {found['measure']}: "
+              f"{found['baseline']:.4g} -> {found['current']:.4g} (x{found['ratio']:.2f})")
+
+    return 1 if regressions or worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
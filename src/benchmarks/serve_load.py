@@ -0,0 +1,176 @@
+import os, sys, json, asyncio
+from argparse import ArgumentParser
+from time import perf_counter
+from numpy import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ScratchML.DecisionTrees.classifier import DTClassifier
+from ScratchML.DecisionTrees.regressor import DTRegressor
+from ScratchML.serving import PredictionServer, load_model
+from benchmarks.synthetic import make_data
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str, payload=None):
+    """
+    Send a single request on a kept-alive connection, and read its response
+
+    Args:
+        reader (asyncio.StreamReader): the connection input
+        writer (asyncio.StreamWriter): the connection output
+        method (str): the HTTP method
+        path (str): the request path
+        payload (dict, optional): the JSON body. Defaults to None.
+
+    Returns:
+        tuple: the HTTP status and the JSON response
+    """
+
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(host: str, port: int, rows: list, requests: int, batch: int, latencies: list):
+    """
+    Send requests one after the other on a single connection
+
+    Args:
+        host (str): the server address
+        port (int): the server port
+        rows (list): the rows to send, cycled through
+        requests (int): the number of requests
+        batch (int): the rows of every request
+        latencies (list): collects the latency of every request, in seconds
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for k in range(requests):
+            start = (k*batch) % len(rows)
+            payload = {"rows": rows[start:start + batch]}
+
+            sent = perf_counter()
+            status, response = await _request(reader, writer, "POST", "/predict", payload)
+            latencies.append(perf_counter() - sent)
+
+            if status != 200:
+                raise RuntimeError(f"the server answered {status}: {response}")
+    finally:
+        writer.close()
+
+
+async def load(host: str, port: int, rows: list, clients: int=32, requests: int=200, batch: int=1):
+    """
+    Load a prediction server with concurrent clients
+
+    Args:
+        host (str): the server address
+        port (int): the server port
+        rows (list): the rows to send, a dict of the column values each
+        clients (int, optional): the number of concurrent connections. Defaults to 32.
+        requests (int, optional): the requests of every client. Defaults to 200.
+        batch (int, optional): the rows of every request. Defaults to 1.
+
+    Returns:
+        dict: the client side throughput and latency percentiles (in milliseconds),
+            and the server statistics
+    """
+
+    latencies = []
+    start = perf_counter()
+    await asyncio.gather(*(_client(host, port, rows, requests, batch, latencies) for _ in range(clients)))
+    elapsed = perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, server = await _request(reader, writer, "GET", "/stats")
+    finally:
+        writer.close()
+
+    p50, p90, p99, worst = percentile(latencies, [50, 90, 99, 100]).tolist()
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "requests_per_second": len(latencies)/elapsed,
+        "rows_per_second": len(latencies)*batch/elapsed,
+        "latency_ms": {"p50": p50*1000, "p90": p90*1000, "p99": p99*1000, "max": worst*1000},
+        "server": server,
+    }
+
+
+async def _benchmark(model, rows: list, args):
+    """
+    Serve a model in process and load it
+
+    Args:
+        model (PredictionModel): the fitted model
+        rows (list): the rows to send
+        args (argparse.Namespace): the command line arguments
+
+    Returns:
+        dict: the load results (see load)
+    """
+
+    server = PredictionServer(model, port=0, max_batch=args.max_batch, max_wait=args.max_wait_ms/1000)
+    port = await server.start()
+    try:
+        return await load("127.0.0.1", port, rows, args.clients, args.requests, args.batch)
+    finally:
+        await server.stop()
+
+
+def main(argv: list=None):
+    """
+    Benchmark the prediction server from the command line, fully offline:
+        a tree is fitted on synthetic data (or loaded), served on a local port and loaded
+        by concurrent clients, or an already running server is loaded.
+
+    Args:
+        argv (list, optional): the command line arguments. Defaults to sys.argv.
+    """
+
+    parser = ArgumentParser(description="Load the ScratchML prediction server with concurrent clients")
+    parser.add_argument("--model", help="a saved tree to serve (see DecisionTree.save), "
+                                        "otherwise a regressor is fitted on synthetic data")
+    parser.add_argument("--classifier", action="store_true", help="fit a classifier instead of a regressor")
+    parser.add_argument("--port", type=int, help="load a server already running on this local port")
+    parser.add_argument("--clients", type=int, default=32, help="the concurrent connections")
+    parser.add_argument("--requests", type=int, default=200, help="the requests of every connection")
+    parser.add_argument("--batch", type=int, default=1, help="the rows of every request")
+    parser.add_argument("--max-batch", type=int, default=256, help="the most rows the server predicts at once")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="the most a request waits for its batch")
+    args = parser.parse_args(argv)
+
+    # the rows keep both labels, a tree never splits on its own label and the other one is a feature
+    data = make_data(8000, seed=0)
+    rows = data.to_dict("records")
+
+    if args.port is not None:
+        results = asyncio.run(load("127.0.0.1", args.port, rows, args.clients, args.requests, args.batch))
+    else:
+        if args.model is not None:
+            model = load_model(args.model)
+        else:
+            model = (DTClassifier if args.classifier else DTRegressor)(data, 10, 5)
+            model.fit()
+        results = asyncio.run(_benchmark(model, rows, args))
+
+    print(json.dumps(results, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from pandas import DataFrame
+from numpy import arange, where, exp, round, clip
+from numpy.random import default_rng
+
+from ScratchML.consts import labelName, labelNumericName, cls_x, cls_y
+
+
+def make_data(rows: int, features: int=0, seed: int=0):
+    """
+    Generate a synthetic real estate table with the schema of data.csv.
+        The binary (availability) and numeric features are drawn around the ranges of the
+        real data, and both labels depend on them, so the trees have splits to find.
+
+    Args:
+        rows (int): the number of rows
+        features (int, optional): the number of extra numeric features (noise),
+            appended as feature_1, feature_2... Defaults to 0.
+        seed (int, optional): the random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: the data, with the index column first and the numeric label last
+    """
+
+    random = default_rng(seed)
+
+    bedrooms = clip(random.poisson(2.7, rows), 1, 43).astype(float)
+    bath = clip(bedrooms + random.integers(-1, 2, rows), 1, 40).astype(float)
+    balcony = random.integers(0, 4, rows).astype(float)
+    total_sqft = round(random.lognormal(6.9 + 0.12*bedrooms, 0.35))
+    ranked = random.integers(1, 505, rows)
+    availability = (random.random(rows) < 0.8).astype(int)
+
+    # plots are the large properties far from the best ranked neighborhoods
+    plot = 1/(1 + exp(-(total_sqft/1000 - 2.2 + ranked/500 - 0.8)*3))
+    area_type = where(random.random(rows) < plot, cls_y, cls_x).astype(object)
+
+    price = round(total_sqft*(9000 - 12*ranked)*(1 + 0.3*(area_type == cls_y))*random.lognormal(0, 0.25, rows), -3)
+
+    data = {
+        "Unnamed: 0": arange(rows),
+        labelName: area_type,
+        "availability": availability,
+        "bedrooms": bedrooms,
+        "total_sqft": total_sqft,
+        "bath": bath,
+        "balcony": balcony,
+        "ranked": ranked,
+    }
+    for k in range(features):
+        data[f"feature_{k+1}"] = random.normal(0, 1, rows)
+    data[labelNumericName] = price.astype(float)
+
+    return DataFrame(data)